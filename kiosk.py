@@ -1,45 +1,514 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import time
+_BOOT = time.perf_counter()
+
 import os
 import configparser
 import sys
-sys.stdout = open('/tmp/kiosk_debug.log', 'a', buffering=1)
-sys.stderr = sys.stdout
 import io
 import math
-import tkinter as tk
-from PIL import Image, ImageTk
-
-try:
-    from libdiscid.compat import discid
-except ImportError:
-    import discid
-
-import musicbrainzngs
-import requests
+import importlib
 import threading
-from tkinter import messagebox
-import time
 import subprocess
-from pydbus import SessionBus
-from pydub import AudioSegment
-from pydub.silence import detect_silence
-from shazamio import Shazam
-import time
 import asyncio
-import audioop
+import concurrent.futures
+import random
+import json
+import hashlib
+import functools
+from collections import OrderedDict, deque
+import wave
+import shlex
+import urllib.parse
+import sqlite3
+import shutil
+import fcntl
+import queue
+import multiprocessing
+import atexit
+import logging
+import logging.handlers
+
+class RingBufferHandler(logging.Handler):
+    # Derniers messages gardés en RAM, tous niveaux confondus
+    # (consultables via /logs sans écrire sur la carte SD)
+    def __init__(self, capacity):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, record):
+        self.records.append(self.format(record))
+
+    def resize(self, capacity):
+        with self.lock:
+            self.records = deque(self.records, maxlen=capacity)
+
+    def lines(self):
+        with self.lock:
+            return list(self.records)
+
+class RateLimitFilter(logging.Filter):
+    # Au plus `burst` messages identiques (même module, même gabarit) par
+    # fenêtre de `window` secondes ; le nombre de messages écartés est
+    # signalé au premier message de la fenêtre suivante
+    def __init__(self, burst=5, window=10.0):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.state = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR and record.exc_info:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self.lock:
+            start, count, dropped = self.state.get(key, (now, 0, 0))
+            if now - start >= self.window:
+                start, count = now, 0
+            if count >= self.burst:
+                self.state[key] = (start, count, dropped + 1)
+                return False
+            self.state[key] = (start, count + 1, 0)
+        if dropped:
+            record.msg = f"[{dropped} messages similaires ignorés] {record.msg}"
+        return True
+
+class AsyncLogHandler(logging.handlers.QueueHandler):
+    # Dépose les records dans une file bornée sans jamais bloquer l'appelant ;
+    # le formatage (%-args) est fait par le thread d'écriture
+    def __init__(self, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+# Les messages émis avant la lecture de la config attendent dans la file ;
+# configure_logging() démarre ensuite le thread d'écriture
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+log = logging.getLogger("kiosk")
+log.setLevel(logging.DEBUG)
+log.propagate = False
+log_ring = RingBufferHandler(1000)
+log_ring.setFormatter(logging.Formatter(LOG_FORMAT))
+log_rate_limit = RateLimitFilter()
+log_handler = AsyncLogHandler()
+log_handler.addFilter(log_rate_limit)
+log.addHandler(log_handler)
+log_listener = None
+
+def apply_log_levels(config):
+    log.setLevel(config.get("LOGGING", "LEVEL", fallback="INFO").upper())
+    # niveaux par module : "cd=DEBUG, capture=WARNING" -> kiosk.cd, kiosk.capture
+    for item in config.get("LOGGING", "LEVELS", fallback="").split(","):
+        if "=" in item:
+            name, level = (part.strip() for part in item.split("=", 1))
+            logging.getLogger(f"kiosk.{name}").setLevel(level.upper())
+
+def configure_logging(config):
+    global log_listener
+    apply_log_levels(config)
+    if multiprocessing.parent_process() is not None:
+        # processus de reconnaissance : ses records partent vers le parent
+        # (voir recognizer_process_main), pas de fichier ici
+        return
+    handlers = [log_ring]
+    log_ring.resize(config.getint("LOGGING", "RING_SIZE", fallback=1000))
+    path = os.path.expanduser(config.get("LOGGING", "FILE", fallback="/tmp/kiosk_debug.log"))
+    file_error = None
+    if path:
+        try:
+            file_handler = logging.handlers.RotatingFileHandler(
+                path,
+                maxBytes=config.getint("LOGGING", "MAX_KB", fallback=512) * 1024,
+                backupCount=config.getint("LOGGING", "BACKUPS", fallback=2),
+                encoding="utf-8",
+            )
+            file_handler.setLevel(config.get("LOGGING", "FILE_LEVEL", fallback="INFO").upper())
+            file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            handlers.append(file_handler)
+        except OSError as e:
+            file_error = e
+    log_rate_limit.burst = config.getint("LOGGING", "RATE_LIMIT", fallback=5)
+    log_rate_limit.window = config.getfloat("LOGGING", "RATE_WINDOW", fallback=10.0)
+    log_listener = logging.handlers.QueueListener(
+        log_handler.queue, *handlers, respect_handler_level=True
+    )
+    log_listener.start()
+    atexit.register(log_listener.stop)
+    if file_error:
+        log.warning("Journal %s inaccessible : %s", path, file_error)
+
+def _log_uncaught(exc_type, exc, tb):
+    log.critical("Exception non gérée", exc_info=(exc_type, exc, tb))
+
+def _log_uncaught_thread(args):
+    log.critical("Exception non gérée dans %s", args.thread.name if args.thread else "?",
+                 exc_info=(args.exc_type, args.exc_value, args.exc_traceback))
+
+sys.excepthook = _log_uncaught
+threading.excepthook = _log_uncaught_thread
+
+startup_log = log.getChild("startup")
+workers_log = log.getChild("workers")
+metrics_log = log.getChild("metrics")
+metadata_log = log.getChild("musicbrainz")
+cache_log = log.getChild("cache")
+cover_log = log.getChild("cover")
+cd_log = log.getChild("cd")
+spotify_log = log.getChild("spotify")
+capture_log = log.getChild("capture")
+shazam_log = log.getChild("shazam")
+bluetooth_log = log.getChild("bluetooth")
+source_log = log.getChild("source")
+ui_log = log.getChild("ui")
+
+class StartupProfile:
+    # Chronologie du démarrage (imports, initialisations, première trame),
+    # en ms depuis le lancement du script
+    def __init__(self, t0):
+        self.t0 = t0
+        self.steps = []
+        self.lock = threading.Lock()
+        self.reported = False
+
+    def record(self, label, start, end):
+        with self.lock:
+            self.steps.append((label, (start - self.t0) * 1000, (end - start) * 1000))
+            if self.reported:
+                # imports paresseux après le boot : une ligne chacun
+                startup_log.info("%s : %.1f ms", label, (end - start) * 1000)
+
+    def step(self, label):
+        profile = self
+
+        class _Step:
+            def __enter__(self):
+                self.start = time.perf_counter()
+
+            def __exit__(self, *exc):
+                profile.record(label, self.start, time.perf_counter())
+
+        return _Step()
+
+    def report(self, label):
+        now = time.perf_counter()
+        with self.lock:
+            self.reported = True
+            startup_log.info("%s après %.1f ms", label, (now - self.t0) * 1000)
+            for name, at, duration in self.steps:
+                startup_log.info("  +%7.1f ms  %7.1f ms  %s", at, duration, name)
+
+startup_profile = StartupProfile(_BOOT)
+
+class LazyModule:
+    # Module importé au premier accès à un attribut, pour que la fenêtre
+    # s'affiche avant que les dépendances propres à chaque source soient chargées
+    def __init__(self, name, loader=None):
+        self._name = name
+        self._loader = loader or (lambda: importlib.import_module(name))
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = self._loader()
+                    startup_profile.record(f"import {self._name}", start, time.perf_counter())
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+def _import_discid():
+    try:
+        from libdiscid.compat import discid
+    except ImportError:
+        import discid
+    return discid
+
+def _import_gst():
+    import gi
+    gi.require_version('Gst', '1.0')
+    from gi.repository import Gst
+    Gst.init(None)
+    return Gst
+
+def _import_glib():
+    from gi.repository import GLib
+    return GLib
+
+with startup_profile.step("import tkinter + PIL"):
+    import tkinter as tk
+    from tkinter import messagebox
+    from PIL import Image, ImageTk
+
+# Dépendances chargées à la première utilisation de leur source
+discid = LazyModule("discid", _import_discid)
+musicbrainzngs = LazyModule("musicbrainzngs")
+requests = LazyModule("requests")
+pydbus = LazyModule("pydbus")
+shazamio = LazyModule("shazamio")
+aiohttp = LazyModule("aiohttp")
+np = LazyModule("numpy")
+Gst = LazyModule("Gst", _import_gst)
+GLib = LazyModule("GLib", _import_glib)
+
+# Ordre de préchauffage en tâche de fond, une fois l'interface affichée
+PREWARM_MODULES = [Gst, discid, musicbrainzngs, requests, pydbus]
+# Reconnaissance Bluetooth : seulement si elle tourne dans ce processus
+PREWARM_RECOGNIZER_MODULES = [np, aiohttp, shazamio]
+
+class CancelToken:
+    # Jeton d'annulation partagé par les workers d'une même génération
+    def __init__(self, generation=0):
+        self.generation = generation
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def wait(self, timeout):
+        # attente interruptible ; True si annulé entre-temps
+        return self._event.wait(timeout)
+
+class WorkerRegistry:
+    # Cycle de vie des threads de travail, groupés par source ("CD",
+    # "Bluetooth"…). Chaque groupe a une génération et un jeton d'annulation ;
+    # en démarrer une nouvelle annule la précédente, et les résultats des
+    # anciens workers sont ignorés. Le nombre total de threads est borné.
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.generations = {}
+        self.tokens = {}
+        self.running = {}
+
+    def start_generation(self, group):
+        with self.lock:
+            old = self.tokens.get(group)
+            if old:
+                old.cancel()
+            generation = self.generations.get(group, 0) + 1
+            token = CancelToken(generation)
+            self.generations[group] = generation
+            self.tokens[group] = token
+            return generation, token
+
+    def current(self, group):
+        with self.lock:
+            if group not in self.tokens:
+                self.generations[group] = 1
+                self.tokens[group] = CancelToken(1)
+            return self.generations[group], self.tokens[group]
+
+    def cancel(self, group=None):
+        with self.lock:
+            for name, token in self.tokens.items():
+                if group is None or name == group:
+                    token.cancel()
+
+    def active_count(self, group=None):
+        with self.lock:
+            if group is None:
+                return sum(self.running.values())
+            return self.running.get(group, 0)
+
+    def spawn(self, group, target, *args, token=None):
+        # `token` : celui de l'appelant, pour qu'un worker lancé par une
+        # génération déjà annulée ne soit pas compté dans la nouvelle
+        if token is None:
+            _, token = self.current(group)
+        generation = token.generation
+        if token.cancelled:
+            workers_log.debug("%s#%d périmé, non démarré", group, generation)
+            return None
+        with self.lock:
+            total = sum(self.running.values())
+            if total >= self.max_workers:
+                workers_log.warning("Limite de %d threads atteinte, %s refusé", self.max_workers, group)
+                return None
+            self.running[group] = self.running.get(group, 0) + 1
+            total += 1
+        workers_log.debug("%s#%d démarré (%d actifs)", group, generation, total)
+
+        def run():
+            try:
+                if not token.cancelled:
+                    target(*args)
+            except Exception as e:
+                workers_log.exception("%s#%d : %r", group, generation, e)
+            finally:
+                with self.lock:
+                    self.running[group] -= 1
+                    total = sum(self.running.values())
+                workers_log.debug("%s#%d terminé (%d actifs)", group, generation, total)
+
+        thread = threading.Thread(target=run, name=f"{group}-{generation}", daemon=True)
+        thread.start()
+        return thread
+
+class MetricsRegistry:
+    # Compteurs et histogrammes des chemins critiques, exposés au format
+    # texte Prometheus (voir MetricsServer)
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.kinds = OrderedDict()
+        self.helps = {}
+        self.series = {}
+        self.gauges = {}
+        # dans le processus de reconnaissance : mesures renvoyées au parent
+        self.forward = None
+
+    def histogram(self, name, help_text, buckets=BUCKETS):
+        self.kinds[name] = ("histogram", buckets)
+        self.helps[name] = help_text
+        self.series[name] = {}
+
+    def counter(self, name, help_text):
+        self.kinds[name] = ("counter", None)
+        self.helps[name] = help_text
+        self.series[name] = {}
+
+    def gauge(self, name, help_text, fn):
+        self.kinds[name] = ("gauge", None)
+        self.helps[name] = help_text
+        self.gauges[name] = fn
+
+    def observe(self, name, value, **labels):
+        if self.forward:
+            self.forward(("metric", ("observe", name, value, labels)))
+            return
+        buckets = self.kinds[name][1]
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            serie = self.series[name].get(key)
+            if serie is None:
+                serie = self.series[name][key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    serie[0][i] += 1
+            serie[1] += value
+            serie[2] += 1
+
+    def inc(self, name, value=1, **labels):
+        if self.forward:
+            self.forward(("metric", ("inc", name, value, labels)))
+            return
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.series[name][key] = self.series[name].get(key, 0) + value
+
+    def since(self, name, start, **labels):
+        # observe le temps écoulé depuis start (time.perf_counter)
+        self.observe(name, time.perf_counter() - start, **labels)
+
+    @staticmethod
+    def _labels(pairs):
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, (kind, buckets) in self.kinds.items():
+                lines.append(f"# HELP {name} {self.helps[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "gauge":
+                    try:
+                        lines.append(f"{name} {self.gauges[name]()}")
+                    except Exception:
+                        pass
+                    continue
+                for key, serie in self.series[name].items():
+                    if kind == "counter":
+                        lines.append(f"{name}{self._labels(key)} {serie}")
+                        continue
+                    counts, total, count = serie
+                    for bound, n in zip(buckets, counts):
+                        lines.append(f"{name}_bucket{self._labels(key + (('le', bound),))} {n}")
+                    lines.append(f"{name}_bucket{self._labels(key + (('le', '+Inf'),))} {count}")
+                    lines.append(f"{name}_sum{self._labels(key)} {total}")
+                    lines.append(f"{name}_count{self._labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+class MetricsServer:
+    # Petit serveur HTTP local : GET /metrics -> texte Prometheus,
+    # GET /logs -> derniers messages du journal en RAM
+    def __init__(self, registry, host, port, ring=None):
+        import http.server
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == "/metrics":
+                    body = registry.render().encode()
+                elif path == "/logs" and ring is not None:
+                    body = ("\n".join(ring.lines()) + "\n").encode()
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
 
-# --- GStreamer imports ---
-import gi
-gi.require_version('Gst', '1.0')
-from gi.repository import Gst, GLib
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+metrics = MetricsRegistry()
+metrics.histogram("kiosk_source_switch_seconds", "Appui sur une source -> source prête")
+metrics.histogram("kiosk_first_audio_seconds", "Appui sur une source -> premier son")
+metrics.histogram("kiosk_disc_toc_seconds", "Début de session disque -> TOC lue")
+metrics.histogram("kiosk_disc_tracklist_seconds", "Début de session disque -> tracklist")
+metrics.histogram("kiosk_cd_playing_seconds", "Démarrage/changement de piste -> PLAYING")
+metrics.histogram("kiosk_musicbrainz_seconds", "Requête MusicBrainz")
+metrics.histogram("kiosk_offline_index_seconds", "Recherche dans l'index MusicBrainz local")
+metrics.histogram("kiosk_cover_fetch_seconds", "Obtention d'une pochette")
+metrics.counter("kiosk_cd_rip_tracks_total", "Pistes extraites vers le cache par résultat")
+metrics.histogram("kiosk_shazam_seconds", "Aller-retour Shazam")
+metrics.counter("kiosk_shazam_requests_total", "Requêtes Shazam par résultat")
+metrics.histogram("kiosk_time_to_identify_seconds", "Début de la musique -> titre identifié (ou abandon)")
+metrics.counter("kiosk_recognition_cache_total", "Consultations du cache de reconnaissance")
+metrics.histogram("kiosk_level_probe_interval_seconds", "Intervalle entre deux sondes de niveau")
+metrics.counter("kiosk_novelty_cpu_seconds_total", "Temps CPU du détecteur de changement de morceau")
+metrics.counter("kiosk_novelty_triggers_total", "Changements de morceau détectés sans blanc")
+metrics.counter("kiosk_recognizer_restarts_total", "Relances du processus de reconnaissance")
+metrics.histogram("kiosk_ui_queue_lag_seconds", "Attente dans la file du dispatcher Tk")
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-CONFIG_PATH = os.path.join(BASE_DIR, "kiosk_config.ini")
+CONFIG_PATH = os.environ.get("KIOSK_CONFIG", os.path.join(BASE_DIR, "kiosk_config.ini"))
 
 config = configparser.ConfigParser()
 config.read(CONFIG_PATH)
+configure_logging(config)
 
 os.environ["SDL_AUDIODRIVER"] = "alsa"
 ICON_DIR = os.path.join(BASE_DIR, config.get("PATHS", "ICON_DIR"))
@@ -47,25 +516,200 @@ CD_DEVICE = config.get("AUDIO", "CD_DEVICE")
 ALSA_DEVICE = config.get("AUDIO", "ALSA_DEVICE")
 ALBUM_ART_SIZE = (200, 200)
 PCM = config.get("AUDIO", "PCM")
-TMP = config.get("AUDIO", "TMP")
+# Source/sortie du moteur CD et commande de capture Bluetooth ; remplaçables
+# (fichiers, fakesink, flux synthétique) pour les mesures hors matériel
+CD_URI = config.get("AUDIO", "CD_URI", fallback="cdda://{track}")
+AUDIO_SINK = config.get("AUDIO", "AUDIO_SINK", fallback="alsasink device={device}")
+CAPTURE_COMMAND = config.get(
+    "AUDIO", "CAPTURE_COMMAND",
+    fallback="arecord -q -D {device} -f S16_LE -r {rate} -c {channels} -t raw"
+)
+MUSICBRAINZ_HOST = config.get("NETWORK", "MUSICBRAINZ_HOST", fallback="musicbrainz.org")
+MUSICBRAINZ_HTTPS = config.getboolean("NETWORK", "MUSICBRAINZ_HTTPS", fallback=True)
+COVERART_URL = config.get("NETWORK", "COVERART_URL", fallback="https://coverartarchive.org")
+SHAZAM_URL = config.get("NETWORK", "SHAZAM_URL", fallback="")
+SAMPLE_RATE = 44100
+CHANNELS = 2
+SAMPLE_WIDTH = 2
+CAPTURE_MARGIN = 2
+SHAZAM_TIMEOUT = config.getfloat("SHAZAM", "TIMEOUT", fallback=8)
+SHAZAM_RETRIES = config.getint("SHAZAM", "RETRIES", fallback=2)
+SHAZAM_BACKOFF = config.getfloat("SHAZAM", "BACKOFF", fallback=0.5)
 CHECK_DURATION = config.getint("AUDIO", "CHECK_DURATION")
 MIN_SILENCE = config.getint("AUDIO", "MIN_SILENCE")
 DURATION_SHAZAM = config.getint("AUDIO", "DURATION_SHAZAM")
+# durées d'échantillon successives (s de musique) tant que Shazam ne trouve rien
+RECOGNITION_SCHEDULE = sorted(
+    float(x) for x in config.get("SHAZAM", "SCHEDULE", fallback=f"3, 6, {DURATION_SHAZAM}").split(",")
+)
+RECOGNITION_MAX_ATTEMPTS = config.getint("SHAZAM", "MAX_ATTEMPTS", fallback=len(RECOGNITION_SCHEDULE))
 SILENCE_THRESHOLD = config.getint("AUDIO", "SILENCE_THRESHOLD")
-
-# --- GStreamer Init ---
-Gst.init(None)
-
-def fetch_album_metadata():
+SILENCE_HYSTERESIS = config.getfloat("AUDIO", "SILENCE_HYSTERESIS", fallback=1.5)
+LEVEL_WINDOW_MS = config.getint("AUDIO", "LEVEL_WINDOW_MS", fallback=100)
+LEVEL_HOLD_MS = config.getint("AUDIO", "LEVEL_HOLD_MS", fallback=300)
+RECOGNIZER_PROCESS = config.getboolean("AUDIO", "RECOGNIZER_PROCESS", fallback=True)
+AVRCP_ENABLED = config.getboolean("BLUETOOTH", "AVRCP", fallback=True)
+AVRCP_BUS = config.get("BLUETOOTH", "BUS", fallback="system")
+BLUEZ_SERVICE = config.get("BLUETOOTH", "SERVICE", fallback="org.bluez")
+NOVELTY_ENABLED = config.getboolean("AUDIO", "NOVELTY", fallback=True)
+NOVELTY_THRESHOLD = config.getfloat("AUDIO", "NOVELTY_THRESHOLD", fallback=0.1)
+NOVELTY_MARGIN = config.getfloat("AUDIO", "NOVELTY_MARGIN", fallback=2.0)
+NOVELTY_BASELINE = config.getfloat("AUDIO", "NOVELTY_BASELINE", fallback=60)
+NOVELTY_RECENT = config.getfloat("AUDIO", "NOVELTY_RECENT", fallback=6)
+NOVELTY_HISTORY = config.getfloat("AUDIO", "NOVELTY_HISTORY", fallback=20)
+NOVELTY_HOLD = config.getfloat("AUDIO", "NOVELTY_HOLD", fallback=2)
+CACHE_DIR = os.path.expanduser(config.get("CACHE", "DIR", fallback="~/.cache/kiosk"))
+METADATA_CACHE_SIZE = config.getint("CACHE", "METADATA_MAX_ENTRIES", fallback=500)
+METADATA_REFRESH = config.getboolean("CACHE", "METADATA_REFRESH", fallback=True)
+METADATA_MAX_AGE = config.getint("CACHE", "METADATA_MAX_AGE_DAYS", fallback=30) * 86400
+RECOGNITION_CACHE_SIZE = config.getint("CACHE", "RECOGNITION_MAX_ENTRIES", fallback=1000)
+RECOGNITION_MAX_BER = config.getfloat("CACHE", "RECOGNITION_MAX_BER", fallback=0.3)
+COVER_MEMORY_ENTRIES = config.getint("CACHE", "COVER_MEMORY_ENTRIES", fallback=32)
+COVER_DISK_MB = config.getint("CACHE", "COVER_DISK_MB", fallback=50)
+OFFLINE_INDEX = os.path.expanduser(
+    config.get("CACHE", "OFFLINE_INDEX", fallback=os.path.join(CACHE_DIR, "musicbrainz_index.sqlite"))
+)
+OFFLINE_FUZZY_SECONDS = config.getfloat("CACHE", "OFFLINE_FUZZY_SECONDS", fallback=5)
+RIP_ENABLED = config.getboolean("CACHE", "RIP", fallback=True)
+RIP_DISK_MB = config.getint("CACHE", "RIP_DISK_MB", fallback=2000)
+RIP_DELAY = config.getfloat("CACHE", "RIP_DELAY", fallback=5)
+RIP_COMMAND = config.get(
+    "AUDIO", "RIP_COMMAND",
+    fallback="nice -n 19 ionice -c 3 gst-launch-1.0 -q cdparanoiasrc device={device} track={track} "
+             "! audioconvert ! flacenc ! filesink location={output}"
+)
+IMAGE_WORKERS = 2
+UI_FRAME_MS = 33
+KEEP_SPOTIFYD_WARM = config.getboolean("SPOTIFY", "KEEP_WARM", fallback=True)
+MAX_WORKERS = config.getint("WORKERS", "MAX", fallback=16)
+METRICS_PORT = config.getint("METRICS", "PORT", fallback=9101)
+METRICS_BIND = config.get("METRICS", "BIND", fallback="127.0.0.1")
+METRICS_ENABLED = config.getboolean("METRICS", "ENABLED", fallback=True)
+VOLUME_MODE = config.get("VOLUME", "MODE", fallback="alsa")
+MIXER_CARD = config.get("VOLUME", "MIXER_CARD", fallback="1")
+MIXER_CONTROL = config.get("VOLUME", "MIXER_CONTROL", fallback="PCM")
+VOLUME_RAMP_MS = config.getint("VOLUME", "RAMP_MS", fallback=40)
+PREWARM = config.getboolean("STARTUP", "PREWARM", fallback=True)
+PREWARM_DELAY_MS = config.getint("STARTUP", "PREWARM_DELAY_MS", fallback=2000)
+
+SECTORS_PER_SECOND = 75
+
+class OfflineIndex:
+    # Index MusicBrainz local en lecture seule (construit par
+    # tools/build_mb_index.py) : disc ID et TOC -> release + tracklist du
+    # medium. Les résultats ont la forme des réponses musicbrainzngs, pour
+    # passer tels quels dans select_medium() / build_tracklist().
+    # Sans disc ID connu, recherche floue sur la TOC : même nombre de pistes,
+    # leadout et début de chaque piste à moins de fuzzy_sectors près.
+    def __init__(self, path, fuzzy_sectors):
+        self.fuzzy_sectors = fuzzy_sectors
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(f"file:{urllib.parse.quote(path)}?mode=ro", uri=True, check_same_thread=False)
+        self.db.execute("PRAGMA mmap_size = 268435456")
+
+    def lookup(self, disc_id, toc=None):
+        start = time.perf_counter()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT discid, medium FROM tocs WHERE discid = ?", (disc_id,)
+            ).fetchone()
+            result = "exact"
+            if row is None and toc:
+                row = self._fuzzy(*toc)
+                result = "fuzzy"
+            if row is None:
+                metrics.since("kiosk_offline_index_seconds", start, result="miss")
+                return None
+            release = self._release(*row)
+        metrics.since("kiosk_offline_index_seconds", start, result=result)
+        return release
+
+    def _fuzzy(self, offsets, leadout):
+        candidates = self.db.execute(
+            "SELECT discid, medium, offsets FROM tocs"
+            " WHERE track_count = ? AND leadout BETWEEN ? AND ?",
+            (len(offsets), leadout - self.fuzzy_sectors, leadout + self.fuzzy_sectors)
+        ).fetchall()
+        best, best_score = None, None
+        for candidate_id, medium, text in candidates:
+            other = [int(x) for x in text.split(",")]
+            # décalage global (pré-gap) ignoré : on compare les débuts relatifs
+            deviations = [abs((a - offsets[0]) - (b - other[0])) for a, b in zip(offsets, other)]
+            if max(deviations) > self.fuzzy_sectors:
+                continue
+            score = sum(deviations)
+            if best_score is None or score < best_score:
+                best, best_score = (candidate_id, medium), score
+        return best
+
+    def _release(self, matched_id, medium_id):
+        release_id, position, medium_title, tracks = self.db.execute(
+            "SELECT release, position, title, tracks FROM media WHERE id = ?", (medium_id,)
+        ).fetchone()
+        mbid, title, artist = self.db.execute(
+            "SELECT mbid, title, artist FROM releases WHERE id = ?", (release_id,)
+        ).fetchone()
+        track_list = []
+        for number, track_title, track_artist, length in json.loads(tracks):
+            track = {"number": number, "recording": {"title": track_title}}
+            if length:
+                track["length"] = str(length)
+            if track_artist:
+                track["artist-credit"] = [{"artist": {"name": track_artist}}]
+            track_list.append(track)
+        medium = {"position": str(position), "disc-list": [{"id": matched_id}], "track-list": track_list}
+        if medium_title:
+            medium["title"] = medium_title
+        return {
+            "id": mbid,
+            "title": title,
+            "artist-credit": [{"artist": {"name": artist}}],
+            "medium-list": [medium],
+        }
+
+_offline_index = None
+
+def get_offline_index():
+    # ouvert au premier disque ; None si aucun index n'a été installé
+    global _offline_index
+    if _offline_index is None and os.path.exists(OFFLINE_INDEX):
+        try:
+            _offline_index = OfflineIndex(OFFLINE_INDEX, int(OFFLINE_FUZZY_SECONDS * SECTORS_PER_SECOND))
+        except sqlite3.Error as e:
+            metadata_log.warning("Index local %s illisible : %s", OFFLINE_INDEX, e)
+    return _offline_index
+
+def lookup_offline_release(disc_id, toc=None):
+    # Même forme de résultat que fetch_album_metadata(), ou None
+    index = get_offline_index()
+    if index is None:
+        return None
     try:
-        disc = discid.read(CD_DEVICE)
-    except Exception:
-        return ("Album inconnu", "Artiste inconnu", None, None)
+        release = index.lookup(disc_id, toc)
+    except sqlite3.Error as e:
+        metadata_log.warning("Index local : %s", e)
+        return None
+    if release is None:
+        return None
+    metadata_log.info("Disque trouvé dans l'index local : %s", release["title"])
+    artist = release["artist-credit"][0]["artist"]["name"] or "Artiste inconnu"
+    return (release["title"] or "Album inconnu", artist, release["id"], release)
+
+def fetch_album_metadata(disc_id=None):
+    if disc_id is None:
+        try:
+            disc_id = discid.read(CD_DEVICE).id
+        except Exception:
+            return ("Album inconnu", "Artiste inconnu", None, None)
 
     musicbrainzngs.set_useragent("MusicKiosk", "1.0", "contact@example.com")
+    musicbrainzngs.set_hostname(MUSICBRAINZ_HOST, use_https=MUSICBRAINZ_HTTPS)
     try:
-        result = musicbrainzngs.get_releases_by_discid(disc.id, includes=["artists", "recordings"])
+        start = time.perf_counter()
+        result = musicbrainzngs.get_releases_by_discid(disc_id, includes=["artists", "recordings"])
+        metrics.since("kiosk_musicbrainz_seconds", start, result="ok")
     except Exception:
+        metrics.since("kiosk_musicbrainz_seconds", start, result="error")
         return ("Album inconnu", "Artiste inconnu", None, None)
 
     release_list = result.get("disc", {}).get("release-list", [])
@@ -82,43 +726,1568 @@ def fetch_album_metadata():
     mbid_release = première_release.get("id", None)
     return (titre_album, artiste_principal, mbid_release, première_release)
 
+def select_medium(release_obj, disc_id, disc_number):
+    medium_list = release_obj.get("medium-list", []) if release_obj else []
+    metadata_log.debug("medium_list: %s", medium_list)
+    selected_medium = None
+
+    if disc_id:
+        for medium in medium_list:
+            disc_list = medium.get("disc-list", [])
+            if any(d.get("id") == disc_id for d in disc_list):
+                selected_medium = medium
+                break
+    if not selected_medium:
+        for medium in medium_list:
+            if medium.get("position") == disc_number:
+                selected_medium = medium
+                break
+    if not selected_medium and medium_list:
+        selected_medium = medium_list[0]
+
+    metadata_log.debug("selected_medium: %s", selected_medium)
+    return selected_medium
+
+def build_tracklist(selected_medium, num_tracks, artiste_principal):
+    tracks_info = []
+    if selected_medium and selected_medium.get("track-list"):
+        for track in selected_medium["track-list"]:
+            titre_piste = track.get("recording", {}).get("title", "Titre inconnu")
+            artist_credits = track.get("artist-credit", [])
+            artiste_piste = " & ".join(
+                ac.get("artist", {}).get("name", "") for ac in artist_credits if ac.get("artist", {})
+            ) or artiste_principal
+            duree = track.get("length", None)
+            if duree:
+                minutes = int(duree) // 60000
+                secondes = (int(duree) % 60000) // 1000
+                duree_fmt = f"{minutes}:{secondes:02d}"
+            else:
+                duree_fmt = "--:--"
+            num_str = track.get("number", "").lstrip("0") or "?"
+            try:
+                num = int(num_str)
+            except ValueError:
+                num = None
+            tracks_info.append({
+                "num": num if num else len(tracks_info) + 1,
+                "titre": titre_piste,
+                "artiste": artiste_piste,
+                "duree_fmt": duree_fmt
+            })
+        # Complète si la base MB est incomplète
+        while len(tracks_info) < num_tracks:
+            tracks_info.append({
+                "num": len(tracks_info) + 1,
+                "titre": f"Piste {len(tracks_info) + 1}",
+                "artiste": artiste_principal,
+                "duree_fmt": "--:--"
+            })
+    else:
+        for idx in range(1, num_tracks + 1):
+            tracks_info.append({
+                "num": idx,
+                "titre": f"Piste {idx}",
+                "artiste": artiste_principal,
+                "duree_fmt": "--:--"
+            })
+    metadata_log.debug("Tracklist construite")
+    return tracks_info
+
+def resolve_disc_metadata(disc_id, num_tracks, disc_number, toc=None):
+    # Index local puis MusicBrainz + sélection du medium + tracklist
+    if disc_id:
+        titre_album, artiste_principal, mbid, release_obj = (
+            lookup_offline_release(disc_id, toc) or fetch_album_metadata(disc_id)
+        )
+    else:
+        titre_album, artiste_principal, mbid, release_obj = ("Album inconnu", "Artiste inconnu", None, None)
+    selected_medium = select_medium(release_obj, disc_id, disc_number)
+    tracks_info = build_tracklist(selected_medium, num_tracks, artiste_principal)
+    medium_title = selected_medium.get("title") if selected_medium else None
+    if medium_title:
+        full_title = f"{titre_album} - {medium_title}"
+    else:
+        full_title = titre_album
+    return {
+        "album": titre_album,
+        "artist": artiste_principal,
+        "mbid": mbid,
+        "release": release_obj,
+        "medium": selected_medium,
+        "tracks": tracks_info,
+        "full_title": full_title,
+    }
+
+def refresh_disc_metadata(disc_id, num_tracks, disc_number, toc=None):
+    # Rafraîchissement en tâche de fond d'une entrée de cache ancienne
+    try:
+        metadata = resolve_disc_metadata(disc_id, num_tracks, disc_number, toc)
+        if metadata["mbid"]:
+            metadata_cache.put(disc_id, metadata)
+            cache_log.info("Metadata rafraîchies pour %s", disc_id)
+    except Exception as e:
+        cache_log.warning("Erreur rafraîchissement %s : %s", disc_id, e)
+
+class MetadataCache:
+    # Cache SQLite persistant des métadonnées MusicBrainz, indexé par disc ID.
+    # Les entrées les moins récemment utilisées sont évincées au-delà de max_entries.
+    def __init__(self, path, max_entries, max_age):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS discs ("
+                " disc_id TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " used_at REAL NOT NULL)"
+            )
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS resume ("
+                " disc_id TEXT PRIMARY KEY,"
+                " track INTEGER NOT NULL,"
+                " position REAL NOT NULL,"
+                " volume INTEGER NOT NULL,"
+                " saved_at REAL NOT NULL)"
+            )
+
+    def get(self, disc_id):
+        with self.lock, self.db:
+            row = self.db.execute(
+                "SELECT data, fetched_at FROM discs WHERE disc_id = ?", (disc_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.db.execute(
+                "UPDATE discs SET used_at = ? WHERE disc_id = ?", (time.time(), disc_id)
+            )
+        try:
+            return json.loads(row[0]), row[1]
+        except ValueError:
+            return None
+
+    def put(self, disc_id, metadata):
+        now = time.time()
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO discs (disc_id, data, fetched_at, used_at) VALUES (?, ?, ?, ?)",
+                (disc_id, json.dumps(metadata), now, now)
+            )
+            self.db.execute(
+                "DELETE FROM discs WHERE disc_id NOT IN ("
+                " SELECT disc_id FROM discs ORDER BY used_at DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+
+    def is_stale(self, fetched_at):
+        return time.time() - fetched_at > self.max_age
+
+    # Où en était la lecture de chaque disque (piste, position en s, volume)
+    def get_resume(self, disc_id):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT track, position, volume FROM resume WHERE disc_id = ?", (disc_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"track": row[0], "position": row[1], "volume": row[2]}
+
+    def put_resume(self, disc_id, track, position, volume):
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO resume (disc_id, track, position, volume, saved_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (disc_id, track, position, volume, time.time())
+            )
+            self.db.execute(
+                "DELETE FROM resume WHERE disc_id NOT IN ("
+                " SELECT disc_id FROM resume ORDER BY saved_at DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+
+workers = WorkerRegistry(MAX_WORKERS)
+metrics.gauge("kiosk_workers_active", "Threads de travail en cours", workers.active_count)
+
+metadata_cache = MetadataCache(
+    os.path.join(CACHE_DIR, "metadata.sqlite"), METADATA_CACHE_SIZE, METADATA_MAX_AGE
+)
+
+class CoverArtCache:
+    # Pochettes prêtes à afficher (ALBUM_ART_SIZE), partagées par toutes les
+    # sources : petit LRU en mémoire devant un cache disque borné de fichiers
+    # déjà redimensionnés. Clé = MBID ou URL.
+    def __init__(self, directory, memory_entries, disk_bytes):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.disk_bytes = disk_bytes
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + ".jpg")
+
+    def _remember(self, key, img):
+        with self.lock:
+            self.memory[key] = img
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_entries:
+                self.memory.popitem(last=False)
+
+    def get(self, key, url, timeout=5):
+        start = time.perf_counter()
+        with self.lock:
+            img = self.memory.get(key)
+            if img is not None:
+                self.memory.move_to_end(key)
+                metrics.since("kiosk_cover_fetch_seconds", start, tier="memory")
+                return img
+
+        path = self._path(key)
+        try:
+            img = Image.open(path)
+            img.load()
+            os.utime(path)
+            self._remember(key, img)
+            metrics.since("kiosk_cover_fetch_seconds", start, tier="disk")
+            return img
+        except OSError:
+            pass
+
+        response = requests.get(url, timeout=timeout)
+        metrics.since("kiosk_cover_fetch_seconds", start, tier="network")
+        if response.status_code != 200:
+            return None
+        img = Image.open(io.BytesIO(response.content)).convert("RGB")
+        img = img.resize(ALBUM_ART_SIZE, Image.LANCZOS)
+        self._remember(key, img)
+        try:
+            tmp = path + ".tmp"
+            img.save(tmp, "JPEG", quality=90)
+            os.replace(tmp, path)
+            self._evict_disk()
+        except OSError as e:
+            cache_log.warning("Écriture pochette impossible : %s", e)
+        return img
+
+    def _evict_disk(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+                total -= size
+            except OSError:
+                pass
+
+cover_cache = CoverArtCache(
+    os.path.join(CACHE_DIR, "covers"), COVER_MEMORY_ENTRIES, COVER_DISK_MB * 1024 * 1024
+)
+
+class RipCache:
+    # Pistes du CD extraites en FLAC pendant la lecture, un répertoire par
+    # disc ID. Extraction en tâche de fond à basse priorité (nice/ionice),
+    # budget disque global avec éviction LRU par disque (mtime du répertoire,
+    # rafraîchi à chaque lecture). Un fichier présent est complet : il n'est
+    # renommé qu'à la fin de l'extraction.
+    # L'extraction a son propre groupe de workers ("rip") : elle continue
+    # pendant les autres sources et n'est annulée que par un autre disque,
+    # l'absence de disque ou l'arrêt du kiosque (la piste partielle est alors
+    # jetée). Elle part de la piste qui suit celle en lecture jusqu'à la
+    # dernière, puis reprend au début ; la piste lue en direct passe en
+    # dernier.
+    def __init__(self, directory, disk_bytes):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.disk_bytes = disk_bytes
+        self.lock = threading.Lock()
+        self.disc_id = None
+        self.playing = 1
+        self.proc = None
+
+    def _disc_dir(self, disc_id):
+        return os.path.join(self.directory, hashlib.sha1(disc_id.encode()).hexdigest())
+
+    def _track_path(self, disc_id, track):
+        return os.path.join(self._disc_dir(disc_id), f"track{track:02d}.flac")
+
+    def track_path(self, disc_id, track):
+        path = self._track_path(disc_id, track)
+        if not os.path.exists(path):
+            return None
+        try:
+            os.utime(self._disc_dir(disc_id))
+        except OSError:
+            pass
+        return path
+
+    def start(self, disc_id, num_tracks, device, playing):
+        with self.lock:
+            self.playing = playing
+            if self.disc_id == disc_id:
+                return                          # extraction déjà en cours
+            self.disc_id = disc_id
+        _, token = workers.start_generation("rip")
+        workers.spawn("rip", self.rip_disc, disc_id, num_tracks, device, token, token=token)
+
+    def cancel(self):
+        # autre disque / plus de disque
+        with self.lock:
+            self.disc_id = None
+        workers.cancel("rip")
+
+    def follow(self, disc_id, track):
+        # piste lue en direct : l'extraction continue à partir de la suivante
+        with self.lock:
+            if self.disc_id == disc_id:
+                self.playing = track
+
+    def stop(self):
+        # arrêt du kiosque : le thread est un démon, on coupe l'extraction ici
+        self.cancel()
+        with self.lock:
+            proc = self.proc
+        if proc and proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    def _next_track(self, disc_id, num_tracks):
+        with self.lock:
+            playing = self.playing
+        order = list(range(playing + 1, num_tracks + 1)) + list(range(1, playing + 1))
+        for track in order:
+            if not os.path.exists(self._track_path(disc_id, track)):
+                return track
+        return None
+
+    def rip_disc(self, disc_id, num_tracks, device, token):
+        try:
+            # Laisse d'abord le lecteur servir le premier son
+            if token.wait(RIP_DELAY):
+                return
+            os.makedirs(self._disc_dir(disc_id), exist_ok=True)
+            os.utime(self._disc_dir(disc_id))
+            while not token.cancelled:
+                track = self._next_track(disc_id, num_tracks)
+                if track is None:
+                    cd_log.info("Disque %s entièrement en cache", disc_id)
+                    return
+                if not self._rip_track(disc_id, track, device, token):
+                    return
+                self._evict(keep=disc_id)
+        finally:
+            with self.lock:
+                if self.disc_id == disc_id and not token.cancelled:
+                    self.disc_id = None
+
+    def _rip_track(self, disc_id, track, device, token):
+        path = self._track_path(disc_id, track)
+        tmp = path + ".part"
+        command = RIP_COMMAND.format(device=device, track=track, output=shlex.quote(tmp))
+        start = time.perf_counter()
+        try:
+            proc = subprocess.Popen(
+                shlex.split(command), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+        except OSError as e:
+            cd_log.warning("Extraction impossible : %s", e)
+            metrics.inc("kiosk_cd_rip_tracks_total", result="error")
+            return False
+        with self.lock:
+            self.proc = proc
+        while proc.poll() is None:
+            if token.wait(0.5):
+                proc.terminate()
+                proc.wait()
+                self._discard(tmp)
+                metrics.inc("kiosk_cd_rip_tracks_total", result="cancelled")
+                return False
+        if proc.returncode != 0:
+            self._discard(tmp)
+            cd_log.warning("Extraction piste %d échouée (code %d)", track, proc.returncode)
+            metrics.inc("kiosk_cd_rip_tracks_total", result="error")
+            return False
+        os.replace(tmp, path)
+        metrics.inc("kiosk_cd_rip_tracks_total", result="ok")
+        cd_log.info("Piste %d extraite en %.1f s", track, time.perf_counter() - start)
+        return True
+
+    @staticmethod
+    def _discard(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _disc_size(self, path):
+        total = 0
+        for name in os.listdir(path):
+            try:
+                total += os.stat(os.path.join(path, name)).st_size
+            except OSError:
+                pass
+        return total
+
+    def _evict(self, keep):
+        with self.lock:
+            keep_dir = os.path.basename(self._disc_dir(keep))
+            entries = []
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                try:
+                    mtime = os.stat(path).st_mtime
+                except OSError:
+                    continue
+                entries.append((name == keep_dir, mtime, self._disc_size(path), path))
+            total = sum(size for _, _, size, _ in entries)
+            # disque en cours jamais évincé ; les autres du plus ancien au plus récent
+            for _, _, size, path in sorted(entries):
+                if total <= self.disk_bytes or os.path.basename(path) == keep_dir:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+
+rip_cache = RipCache(os.path.join(CACHE_DIR, "rips"), RIP_DISK_MB * 1024 * 1024)
+atexit.register(rip_cache.stop)
+
+class ImageLoader:
+    # Pool de workers qui télécharge/décode les pochettes hors du thread Tk.
+    # Chaque demande reçoit un numéro de génération : une nouvelle demande
+    # (ou cancel()) rend les précédentes obsolètes, leurs résultats sont jetés.
+    def __init__(self, workers):
+        self.pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="cover"
+        )
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def request(self, key, url, deliver, timeout=5):
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+
+        def job():
+            if not self.is_current(generation):
+                return
+            try:
+                img = cover_cache.get(key, url, timeout)
+            except Exception as e:
+                cover_log.warning("%s : %s", url, e)
+                img = None
+            if self.is_current(generation):
+                deliver(generation, img)
+
+        self.pool.submit(job)
+        return generation
+
+    def is_current(self, generation):
+        return generation == self.generation
+
+    def cancel(self):
+        with self.lock:
+            self.generation += 1
+
 def fetch_cover_art(mbid_release):
-    print("Mbid : ",mbid_release)
+    cover_log.debug("Mbid : %s", mbid_release)
     if not mbid_release:
         return None
     try:
-        url = f"https://coverartarchive.org/release/{mbid_release}/front-250"
-        response = requests.get(url, timeout=5)
-        if response.status_code == 200:
-            img = Image.open(io.BytesIO(response.content))
-            return img.resize(ALBUM_ART_SIZE, Image.LANCZOS)
+        url = f"{COVERART_URL}/release/{mbid_release}/front-250"
+        return cover_cache.get(f"mbid:{mbid_release}", url)
     except Exception:
         return None
 
+CDROM_MEDIA_CHANGED = 0x5325
+CDROM_DRIVE_STATUS = 0x5326
+CDS_DISC_OK = 4
+CDSL_CURRENT = 0x7fffffff
+
+def disc_changed(device):
+    # Vrai si le disque a pu changer depuis le dernier appel (éjection,
+    # nouveau disque, plateau vide). Interroge le noyau sans relire la TOC ;
+    # dans le doute (ioctl indisponible), on considère qu'il a changé.
+    try:
+        fd = os.open(device, os.O_RDONLY | os.O_NONBLOCK)
+    except OSError:
+        return True
+    try:
+        if fcntl.ioctl(fd, CDROM_DRIVE_STATUS, CDSL_CURRENT) != CDS_DISC_OK:
+            return True
+        return fcntl.ioctl(fd, CDROM_MEDIA_CHANGED, CDSL_CURRENT) != 0
+    except OSError:
+        return True
+    finally:
+        os.close(fd)
+
+def disc_toc(disc):
+    # (débuts de piste, leadout) en secteurs, selon la liaison libdiscid
+    try:
+        offsets = getattr(disc, "track_offsets", None)
+        if offsets is None:
+            offsets = [track.offset for track in disc.tracks]
+        return list(offsets), disc.sectors
+    except Exception:
+        return None
+
+class DiscSession:
+    # Session de lecture d'un disque : la TOC n'est lue qu'une fois, puis
+    # la recherche MusicBrainz et la pochette tournent en parallèle.
+    # Quand le MBID est connu (cache), la pochette part en même temps que les
+    # métadonnées ; sinon elle part dès que MusicBrainz a répondu, sans
+    # retarder l'affichage de la tracklist.
+    # Si le disque n'a pas changé depuis la session précédente, sa TOC et ses
+    # métadonnées sont reprises telles quelles, sans accès au lecteur.
+    def __init__(self, device, token, previous=None):
+        self.device = device
+        self.token = token
+        self.previous = previous
+        self.disc_id = None
+        self.num_tracks = 1
+        self.disc_number = "1"
+        self.toc = None
+        self.metadata = None
+        self.resume = None
+        self._cover_started = False
+
+    def start(self, on_toc, on_metadata, on_cover, on_error):
+        workers.spawn("CD", self._run, on_toc, on_metadata, on_cover, on_error, token=self.token)
+
+    def read_toc(self):
+        try:
+            disc = discid.read(self.device)
+            self.num_tracks = disc.last_track_num
+            self.disc_id = disc.id
+            self.disc_number = str(getattr(disc, 'disc_number', 1))
+            self.toc = disc_toc(disc)
+            cd_log.info("Infos CD: num_tracks=%s, disc_id=%s, disc_number=%s", self.num_tracks, self.disc_id, self.disc_number)
+        except Exception as e:
+            cd_log.error("Erreur discid.read : %s", e)
+
+    def _run(self, on_toc, on_metadata, on_cover, on_error):
+        cd_log.info("Début session disque")
+        start = time.perf_counter()
+        previous, self.previous = self.previous, None
+        reused = bool(previous and previous.disc_id and not disc_changed(self.device))
+        if reused:
+            cd_log.info("Même disque (%s), TOC reprise", previous.disc_id)
+            self.disc_id = previous.disc_id
+            self.num_tracks = previous.num_tracks
+            self.disc_number = previous.disc_number
+            self.toc = previous.toc
+            self.metadata = previous.metadata
+            self.resume = previous.resume
+        else:
+            self.read_toc()
+            # remet à zéro l'indicateur de changement pour la prochaine fois
+            disc_changed(self.device)
+            if self.disc_id:
+                self.resume = metadata_cache.get_resume(self.disc_id)
+        metrics.since("kiosk_disc_toc_seconds", start, reused=str(reused).lower())
+        if self.token.cancelled:
+            return
+        on_toc(self)
+        if RIP_ENABLED and self.disc_id:
+            playing = 1
+            if self.resume and 1 <= self.resume["track"] <= self.num_tracks:
+                playing = self.resume["track"]
+            rip_cache.start(self.disc_id, self.num_tracks, self.device, playing)
+        elif RIP_ENABLED:
+            rip_cache.cancel()
+
+        if self.metadata:
+            self._start_cover(self.metadata["mbid"], on_cover)
+            metrics.since("kiosk_disc_tracklist_seconds", start, cached="session")
+            on_metadata(self, self.metadata)
+            return
+
+        try:
+            cached = metadata_cache.get(self.disc_id) if self.disc_id else None
+            if cached:
+                metadata, fetched_at = cached
+                cache_log.info("Metadata en cache pour %s", self.disc_id)
+                self._start_cover(metadata["mbid"], on_cover)
+                if METADATA_REFRESH and metadata_cache.is_stale(fetched_at):
+                    # groupe à part : le rafraîchissement du cache survit à un
+                    # changement de source
+                    workers.spawn(
+                        "cache", refresh_disc_metadata,
+                        self.disc_id, self.num_tracks, self.disc_number, self.toc
+                    )
+            else:
+                metadata = resolve_disc_metadata(self.disc_id, self.num_tracks, self.disc_number, self.toc)
+                if self.disc_id and metadata["mbid"]:
+                    metadata_cache.put(self.disc_id, metadata)
+                self._start_cover(metadata["mbid"], on_cover)
+        except Exception as e:
+            metadata_log.error("Erreur parsing tracklist : %s", e)
+            if not self.token.cancelled:
+                on_error(self, e)
+            return
+
+        self.metadata = metadata
+        metrics.since("kiosk_disc_tracklist_seconds", start, cached=str(bool(cached)).lower())
+        if self.token.cancelled:
+            return
+        metadata_log.info("Metadata récupérées: %s, %s, %s", metadata["album"], metadata["artist"], metadata["mbid"])
+        on_metadata(self, metadata)
+
+    def _start_cover(self, mbid, on_cover):
+        if self._cover_started:
+            return
+        self._cover_started = True
+
+        def fetch():
+            try:
+                cover = fetch_cover_art(mbid)
+                cover_log.info("Cover récupérée ? %s", "Oui" if cover else "Non")
+            except Exception as e:
+                cover_log.error("Erreur fetch_cover_art : %s", e)
+                cover = None
+            if not self.token.cancelled:
+                on_cover(self, cover)
+
+        workers.spawn("CD", fetch, token=self.token)
+
+SPOTIFYD_MPRIS_PREFIX = "org.mpris.MediaPlayer2.spotifyd"
+
 def get_spotifyd_mpris_name(bus):
     # Accès direct au bus D-Bus pour lister les noms (org.freedesktop.DBus)
     dbus_proxy = bus.get('.DBus')
-    names = dbus_proxy.ListNames()
-    print("Noms DBus détectés :", names)  # Pour debug
-    for name in names:
-        if name.startswith("org.mpris.MediaPlayer2.spotifyd"):
+    for name in dbus_proxy.ListNames():
+        if name.startswith(SPOTIFYD_MPRIS_PREFIX):
             return name
     return None
 
+class SpotifySource:
+    # Métadonnées Spotify pilotées par les signaux D-Bus, sans sondage :
+    # une seule connexion au bus de session, NameOwnerChanged pour suivre
+    # l'apparition/disparition de spotifyd, PropertiesChanged sur
+    # org.mpris.MediaPlayer2.Player pour les changements de piste.
+    # Les signaux sont délivrés dans le thread de la boucle GLib.
+    PLAYER_IFACE = "org.mpris.MediaPlayer2.Player"
+    MPRIS_PATH = "/org/mpris/MediaPlayer2"
+
+    def __init__(self, on_track, on_waiting):
+        self.on_track = on_track
+        self.on_waiting = on_waiting
+        self.bus = None
+        self.service_name = None
+        self.last_track_id = None
+        self._name_sub = None
+        self._props_sub = None
+        self.active = False
+
+    def start(self):
+        self.active = True
+        GLib.idle_add(self._connect)
+
+    def stop(self):
+        # plus aucun rappel vers l'UI, même si un signal est déjà en file
+        self.active = False
+        GLib.idle_add(self._disconnect)
+
+    def _connect(self):
+        if not self.active:
+            return False
+        try:
+            if self.bus is None:
+                self.bus = pydbus.SessionBus()
+            self._name_sub = self.bus.subscribe(
+                sender="org.freedesktop.DBus", iface="org.freedesktop.DBus",
+                signal="NameOwnerChanged", signal_fired=self._on_name_owner_changed
+            )
+            name = get_spotifyd_mpris_name(self.bus)
+            if name:
+                self._attach(name)
+            else:
+                self.on_waiting("spotifyd absent du bus")
+        except Exception as e:
+            self.on_waiting(e)
+        return False
+
+    def _disconnect(self):
+        self._detach()
+        if self._name_sub:
+            self._name_sub.disconnect()
+            self._name_sub = None
+        return False
+
+    def _on_name_owner_changed(self, sender, obj, iface, signal, params):
+        name, old_owner, new_owner = params
+        if not name.startswith(SPOTIFYD_MPRIS_PREFIX):
+            return
+        if new_owner:
+            spotify_log.info("%s disponible", name)
+            self._attach(name)
+        elif name == self.service_name:
+            spotify_log.info("%s disparu", name)
+            self._detach()
+            if self.active:
+                self.on_waiting("spotifyd arrêté")
+
+    def _attach(self, name):
+        self._detach()
+        self.service_name = name
+        self._props_sub = self.bus.subscribe(
+            sender=name, iface="org.freedesktop.DBus.Properties",
+            signal="PropertiesChanged", object=self.MPRIS_PATH,
+            signal_fired=self._on_properties_changed
+        )
+        try:
+            player = self.bus.get(name, self.MPRIS_PATH)
+            self._publish(player.Metadata)
+        except Exception as e:
+            self.on_waiting(e)
+
+    def _detach(self):
+        if self._props_sub:
+            self._props_sub.disconnect()
+            self._props_sub = None
+        self.service_name = None
+        self.last_track_id = None
+
+    def _on_properties_changed(self, sender, obj, iface, signal, params):
+        interface, changed, invalidated = params
+        if interface == self.PLAYER_IFACE and 'Metadata' in changed:
+            self._publish(changed['Metadata'])
+
+    def _publish(self, metadata):
+        track_obj = metadata.get('mpris:trackid', None)
+        track_uri = str(track_obj) if track_obj is not None else None
+        if not self.active or track_uri == self.last_track_id:
+            return
+        self.last_track_id = track_uri
+        self.on_track({
+            'title': metadata.get('xesam:title', 'Inconnu'),
+            'artist': ', '.join(metadata.get('xesam:artist', [])),
+            'album': metadata.get('xesam:album', ''),
+            'cover': metadata.get('mpris:artUrl', None),
+        })
+
+class AvrcpSource:
+    # Métadonnées AVRCP publiées par le téléphone (org.bluez.MediaPlayer1 de
+    # BlueZ, bus système) : affichage immédiat, sans capture ni réseau.
+    # Les lecteurs apparaissent/disparaissent via InterfacesAdded/Removed de
+    # l'ObjectManager, les changements de piste arrivent en PropertiesChanged.
+    # on_metadata(bool) indique si l'appareil fournit des titres, pour ne
+    # lancer la reconnaissance audio qu'à défaut. Signaux délivrés dans le
+    # thread de la boucle GLib, comme pour SpotifySource.
+    PLAYER_IFACE = "org.bluez.MediaPlayer1"
+    MANAGER_IFACE = "org.freedesktop.DBus.ObjectManager"
+
+    def __init__(self, on_track, on_metadata):
+        self.on_track = on_track
+        self.on_metadata = on_metadata
+        self.bus = None
+        self.players = {}
+        self.has_metadata = None
+        self.last_key = None
+        self._subs = []
+        self.active = False
+
+    def start(self):
+        self.active = True
+        GLib.idle_add(self._connect)
+
+    def stop(self):
+        self.active = False
+        GLib.idle_add(self._disconnect)
+
+    def _connect(self):
+        if not self.active:
+            return False
+        try:
+            self.bus = pydbus.SessionBus() if AVRCP_BUS == "session" else pydbus.SystemBus()
+            self._subs = [
+                self.bus.subscribe(
+                    sender=BLUEZ_SERVICE, iface=self.MANAGER_IFACE,
+                    signal="InterfacesAdded", signal_fired=self._on_interfaces_added
+                ),
+                self.bus.subscribe(
+                    sender=BLUEZ_SERVICE, iface=self.MANAGER_IFACE,
+                    signal="InterfacesRemoved", signal_fired=self._on_interfaces_removed
+                ),
+                self.bus.subscribe(
+                    sender=BLUEZ_SERVICE, iface="org.freedesktop.DBus.Properties",
+                    signal="PropertiesChanged", signal_fired=self._on_properties_changed
+                ),
+            ]
+            manager = self.bus.get(BLUEZ_SERVICE, "/")
+            for path, interfaces in manager.GetManagedObjects().items():
+                if self.PLAYER_IFACE in interfaces:
+                    self.players[path] = dict(interfaces[self.PLAYER_IFACE])
+        except Exception as e:
+            bluetooth_log.warning("AVRCP indisponible : %s", e)
+        self._update()
+        return False
+
+    def _disconnect(self):
+        for sub in self._subs:
+            sub.disconnect()
+        self._subs = []
+        self.players.clear()
+        return False
+
+    def _on_interfaces_added(self, sender, obj, iface, signal, params):
+        path, interfaces = params
+        if self.PLAYER_IFACE in interfaces:
+            bluetooth_log.info("Lecteur AVRCP %s", path)
+            self.players[path] = dict(interfaces[self.PLAYER_IFACE])
+            self._update()
+
+    def _on_interfaces_removed(self, sender, obj, iface, signal, params):
+        path, interfaces = params
+        if self.PLAYER_IFACE in interfaces and self.players.pop(path, None) is not None:
+            bluetooth_log.info("Lecteur AVRCP %s parti", path)
+            self._update()
+
+    def _on_properties_changed(self, sender, obj, iface, signal, params):
+        interface, changed, invalidated = params
+        if interface != self.PLAYER_IFACE:
+            return
+        props = self.players.setdefault(obj, {})
+        props.update(changed)
+        for name in invalidated:
+            props.pop(name, None)
+        self._update()
+
+    def _current(self):
+        # le lecteur qui joue, sinon le premier qui a un titre
+        with_title = [
+            (path, props) for path, props in self.players.items()
+            if props.get("Track", {}).get("Title")
+        ]
+        for path, props in with_title:
+            if props.get("Status") == "playing":
+                return path, props
+        return with_title[0] if with_title else (None, None)
+
+    def _update(self):
+        if not self.active:
+            return
+        path, props = self._current()
+        has_metadata = path is not None
+        if has_metadata != self.has_metadata:
+            self.has_metadata = has_metadata
+            self.on_metadata(has_metadata)
+        if not has_metadata:
+            self.last_key = None
+            return
+        track = props["Track"]
+        key = (path, track.get("Title"), track.get("Artist"), track.get("Album"))
+        if key == self.last_key:
+            return
+        self.last_key = key
+        self.on_track({
+            'title': track.get("Title", "Inconnu"),
+            'artist': track.get("Artist", ""),
+            'album': track.get("Album", ""),
+            'cover': None,
+        })
+
+class CdEngine:
+    # Un seul playbin pour tout le disque. Les changements de piste ne
+    # reconstruisent jamais le pipeline :
+    #  - fin de piste : l'URI suivante est fournie sur about-to-finish (gapless)
+    #  - Next/Previous : seek au format "track" sur la source cdda, avec repli
+    #    sur READY + nouvelle URI (l'alsasink reste ouvert)
+    # uri_for(piste) choisit la source : fichier du cache d'extraction si la
+    # piste y est, sinon le lecteur.
+    def __init__(self, device, alsa_device, on_track_change, on_end, on_error, on_playing=None,
+                 uri_for=None):
+        self.device = device
+        self.uri_for = uri_for or (lambda track: CD_URI.format(track=track))
+        self.uri = None
+        self.alsa_device = alsa_device
+        self.on_track_change = on_track_change
+        self.on_end = on_end
+        self.on_error = on_error
+        self.on_playing = on_playing
+        self.num_tracks = 0
+        self.current_track = 1
+        self.active = False
+        self._pending_track = None
+        self._pending_position = None
+        self._play_started = None
+        self._lock = threading.Lock()
+
+        self.playbin = Gst.ElementFactory.make("playbin", "cd_player")
+        sink = Gst.parse_bin_from_description(
+            "volume name=cd_volume ! queue max-size-buffers=0 max-size-time=0 max-size-bytes=2097152 "
+            f"! audioconvert ! audioresample ! {AUDIO_SINK.format(device=alsa_device)}", True
+        )
+        self.playbin.set_property("audio-sink", sink)
+        self.volume_elem = sink.get_by_name("cd_volume")
+        self.playbin.connect("source-setup", self._on_source_setup)
+        self.playbin.connect("about-to-finish", self._on_about_to_finish)
+        bus = self.playbin.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message", self._on_message)
+
+    def _on_source_setup(self, playbin, source):
+        if source.find_property("device") is not None:
+            source.set_property("device", self.device)
+
+    def _on_about_to_finish(self, playbin):
+        # Appelé depuis le thread de streaming : on pré-enchaîne la piste suivante
+        with self._lock:
+            next_track = self.current_track + 1
+            if next_track > self.num_tracks:
+                return
+            self._pending_track = next_track
+            self.uri = self.uri_for(next_track)
+        playbin.set_property("uri", self.uri)
+
+    def _on_message(self, bus, message):
+        t = message.type
+        if t == Gst.MessageType.STREAM_START:
+            with self._lock:
+                index = self._pending_track
+                self._pending_track = None
+                if index is not None:
+                    self.current_track = index
+            if index is not None:
+                self.on_track_change(index)
+        elif t == Gst.MessageType.ASYNC_DONE:
+            position, self._pending_position = self._pending_position, None
+            if position:
+                # reprise : préchargé en pause, on se place puis on joue
+                self.playbin.seek_simple(
+                    Gst.Format.TIME, Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE,
+                    int(position * Gst.SECOND)
+                )
+                self.playbin.set_state(Gst.State.PLAYING)
+                return
+            # pipeline préchargé après un démarrage ou un seek : le son part
+            started, self._play_started = self._play_started, None
+            if started:
+                start, mode = started
+                metrics.since("kiosk_cd_playing_seconds", start, mode=mode)
+                if self.on_playing:
+                    self.on_playing()
+        elif t == Gst.MessageType.EOS:
+            self.playbin.set_state(Gst.State.READY)
+            self.active = False
+            self.on_end()
+        elif t == Gst.MessageType.ERROR:
+            err, dbg = message.parse_error()
+            cd_log.error("GStreamer : %s (%s)", err, dbg)
+            self.playbin.set_state(Gst.State.READY)
+            self.active = False
+            self.on_error(err)
+
+    def play_track(self, index, num_tracks, position=None):
+        t0 = time.time()
+        self.num_tracks = num_tracks
+        with self._lock:
+            self._pending_track = None
+            previous = self.current_track
+            self.current_track = index
+        uri = self.uri_for(index)
+
+        # seek dans la source cdda seulement si la piste n'est pas en cache
+        from_drive = uri == CD_URI.format(track=index)
+        playing_from_drive = self.uri == CD_URI.format(track=previous)
+        if self.active and not position and from_drive and playing_from_drive and self._seek_track(index):
+            self.uri = uri
+            self._play_started = (time.perf_counter(), "seek")
+            self.playbin.set_state(Gst.State.PLAYING)
+            cd_log.info("Seek piste %d -> %d en %.1f ms", previous, index, (time.time() - t0) * 1000)
+            return
+
+        self.playbin.set_state(Gst.State.READY)
+        self.uri = uri
+        self.playbin.set_property("uri", uri)
+        self._play_started = (time.perf_counter(), "uri" if from_drive else "cache")
+        self._pending_position = position
+        self.playbin.set_state(Gst.State.PAUSED if position else Gst.State.PLAYING)
+        self.active = True
+        cd_log.info("Démarrage piste %d en %.1f ms", index, (time.time() - t0) * 1000)
+
+    def position(self):
+        ok, nanoseconds = self.playbin.query_position(Gst.Format.TIME)
+        return nanoseconds / Gst.SECOND if ok else None
+
+    def _seek_track(self, index):
+        # Le format "track" n'existe qu'une fois la source cdda chargée
+        track_format = Gst.Format.get_by_nick("track")
+        if track_format == Gst.Format.UNDEFINED:
+            return False
+        return self.playbin.seek_simple(
+            track_format, Gst.SeekFlags.FLUSH | Gst.SeekFlags.KEY_UNIT, index - 1
+        )
+
+    def pause(self):
+        self.playbin.set_state(Gst.State.PAUSED)
+
+    def resume(self):
+        self.playbin.set_state(Gst.State.PLAYING)
+
+    def stop(self):
+        # NULL libère le périphérique ALSA pour les autres sources,
+        # sans détruire le pipeline
+        self.playbin.set_state(Gst.State.NULL)
+        self.active = False
+        self._pending_position = None
+        with self._lock:
+            self._pending_track = None
+
+class AudioCapture:
+    # Capture continue du PCM loopback : un seul arecord qui écrit en brut
+    # sur un pipe, dont les données alimentent un tampon circulaire en mémoire.
+    # Les positions sont exprimées en octets depuis le début de la capture.
+    CHUNK = 4096
+
+    def __init__(self, device, seconds):
+        self.device = device
+        self.bytes_per_second = SAMPLE_RATE * CHANNELS * SAMPLE_WIDTH
+        self.frame_size = CHANNELS * SAMPLE_WIDTH
+        self.capacity = int(seconds * self.bytes_per_second) // self.frame_size * self.frame_size
+        self.buffer = bytearray(self.capacity)
+        self.position = 0
+        self.cond = threading.Condition()
+        self.running = False
+        self.proc = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        if workers.spawn("Bluetooth", self._reader) is None:
+            self.running = False
+
+    def stop(self):
+        self.running = False
+        proc = self.proc
+        if proc and proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        with self.cond:
+            self.cond.notify_all()
+
+    def _reader(self):
+        chunk = bytearray(self.CHUNK)
+        view = memoryview(chunk)
+        while self.running:
+            command = CAPTURE_COMMAND.format(device=self.device, rate=SAMPLE_RATE, channels=CHANNELS)
+            self.proc = subprocess.Popen(
+                shlex.split(command), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0
+            )
+            while self.running:
+                n = self.proc.stdout.readinto(view)
+                if not n:
+                    break
+                self._append(view[:n])
+            if self.proc.poll() is None:
+                self.proc.terminate()
+            self.proc.wait()
+            if self.running:
+                capture_log.warning("Capture interrompue, redémarrage…")
+                time.sleep(1)
+
+    def _append(self, data):
+        n = len(data)
+        with self.cond:
+            start = self.position % self.capacity
+            first = min(n, self.capacity - start)
+            self.buffer[start:start + first] = data[:first]
+            if first < n:
+                self.buffer[:n - first] = data[first:]
+            self.position += n
+            self.cond.notify_all()
+
+    def read(self, start, end):
+        # Copie des octets [start, end[ encore présents dans le tampon
+        with self.cond:
+            start = max(start, self.position - self.capacity, 0)
+            end = min(end, self.position)
+            start -= start % self.frame_size
+            end -= end % self.frame_size
+            if end <= start:
+                return b""
+            a = start % self.capacity
+            b = a + (end - start)
+            if b <= self.capacity:
+                return bytes(self.buffer[a:b])
+            return bytes(self.buffer[a:]) + bytes(self.buffer[:b - self.capacity])
+
+    def latest(self, seconds):
+        end = self.position
+        size = int(seconds * self.bytes_per_second)
+        return self.read(end - size + size % self.frame_size, end)
+
+    def wait_until(self, position, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        with self.cond:
+            while self.running and self.position < position:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            return self.position >= position
+
+def pcm_to_wav(pcm):
+    out = io.BytesIO()
+    with wave.open(out, "wb") as w:
+        w.setnchannels(CHANNELS)
+        w.setsampwidth(SAMPLE_WIDTH)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(pcm)
+    return out.getvalue()
+
+# --- Analyse de niveau (NumPy) ---
+def pcm_frames(pcm):
+    # Vue sans copie (frames x canaux, int16) sur un tampon PCM
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    usable = len(samples) - len(samples) % CHANNELS
+    return samples[:usable].reshape(-1, CHANNELS)
+
+def window_levels(frames, window, hop=None):
+    # RMS, crête et facteur de crête par canal sur des fenêtres glissantes.
+    # Retourne trois tableaux (fenêtres x canaux).
+    hop = hop or window
+    if len(frames) < window:
+        empty = np.zeros((0, frames.shape[1]), dtype=np.float32)
+        return empty, empty, empty
+    windows = np.lib.stride_tricks.sliding_window_view(frames, window, axis=0)[::hop]
+    x = windows.astype(np.float32)
+    rms = np.sqrt(np.einsum("wcn,wcn->wc", x, x) / window)
+    peak = np.abs(x).max(axis=-1)
+    crest = peak / np.maximum(rms, 1.0)
+    return rms, peak, crest
+
+class LevelGate:
+    # Décision musique/silence avec hystérésis : il faut passer au-dessus de
+    # on_threshold pour basculer en musique et redescendre sous off_threshold
+    # pour revenir au silence, pendant hold fenêtres consécutives.
+    def __init__(self, on_threshold, off_threshold, hold):
+        self.on_threshold = on_threshold
+        self.off_threshold = off_threshold
+        self.hold = hold
+        self.music = False
+        self._count = 0
+
+    def update(self, rms):
+        # rms : niveaux (fenêtres x canaux), le canal le plus fort fait foi
+        for level in rms.max(axis=1):
+            if self.music:
+                flip = level < self.off_threshold
+            else:
+                flip = level > self.on_threshold
+            self._count = self._count + 1 if flip else 0
+            if self._count >= self.hold:
+                self.music = not self.music
+                self._count = 0
+        return self.music
+
+class NoveltyDetector:
+    # Changement de morceau sans blanc (mix, fondus enchaînés, live) : un
+    # profil spectral (log-énergie par bande, centré) toutes les 0,5 s ;
+    # la corrélation entre la moyenne des `recent` dernières secondes et
+    # celle des `history` précédentes chute quand la musique change. Une FFT
+    # de 0,5 s d'audio décimé à ~11 kHz par profil : négligeable même sur
+    # Zero 2.
+    # Le seuil est relatif : un morceau chargé varie beaucoup plus qu'un
+    # morceau calme. On garde l'écart observé sur les `baseline` dernières
+    # secondes ; il faut dépasser `margin` fois son 90e centile (et au moins
+    # `threshold`) pendant `hold` secondes. Pas de déclenchement tant que
+    # cette référence n'est pas à moitié remplie. Un déclenchement qui
+    # retombe sur le même morceau double l'exigence (jusqu'à MAX_BACKOFF).
+    DECIMATE = 4
+    BLOCK_SECONDS = 0.5
+    BANDS = 16
+    MAX_BACKOFF = 4
+
+    def __init__(self, threshold, recent, history, hold, margin, baseline):
+        self.threshold = threshold
+        self.margin = margin
+        self.hold = max(1, int(hold / self.BLOCK_SECONDS))
+        self.recent = max(1, int(recent / self.BLOCK_SECONDS))
+        self.history = max(1, int(history / self.BLOCK_SECONDS))
+        # écart « normal » du morceau en cours : survit aux reset()
+        self.baseline = deque(maxlen=max(2, int(baseline / self.BLOCK_SECONDS)))
+        self.backoff = 1
+        self.block = int(SAMPLE_RATE * self.BLOCK_SECONDS) // self.DECIMATE * self.DECIMATE
+        n = self.block // self.DECIMATE
+        rate = SAMPLE_RATE / self.DECIMATE
+        self.window = np.hanning(n).astype(np.float32)
+        self.edges = np.unique(np.round(np.geomspace(80, 5000, self.BANDS + 1) * n / rate).astype(int))
+        self.reset()
+
+    def reset(self):
+        self.pending = np.zeros((0, CHANNELS), dtype=np.int16)
+        self.profiles = deque(maxlen=self.recent + self.history)
+        self._count = 0
+
+    def _profile(self, frames):
+        mono = frames.mean(axis=1, dtype=np.float32).reshape(-1, self.DECIMATE).mean(axis=1)
+        power = np.abs(np.fft.rfft(mono * self.window)) ** 2
+        bands = np.log1p(np.add.reduceat(power[:self.edges[-1]], self.edges[:-1]))
+        return bands - bands.mean()
+
+    def novelty(self):
+        profiles = np.array(self.profiles)
+        old = profiles[:self.history].mean(axis=0)
+        new = profiles[self.history:].mean(axis=0)
+        norm = np.linalg.norm(old) * np.linalg.norm(new)
+        return 1.0 - float(old @ new / norm) if norm else 0.0
+
+    def update(self, pcm):
+        # True quand un nouveau morceau semble avoir commencé
+        cpu = time.thread_time()
+        frames = np.concatenate((self.pending, pcm_frames(pcm)))
+        usable = len(frames) - len(frames) % self.block
+        self.pending = frames[usable:]
+        changed = False
+        for start in range(0, usable, self.block):
+            self.profiles.append(self._profile(frames[start:start + self.block]))
+            if len(self.profiles) < self.profiles.maxlen:
+                continue
+            value = self.novelty()
+            limit = self.limit()
+            if limit is not None and value > limit:
+                self._count += 1
+            else:
+                self._count = 0
+                self.baseline.append(value)
+            if self._count >= self.hold:
+                changed = True
+                self.reset()
+                break
+        metrics.inc("kiosk_novelty_cpu_seconds_total", time.thread_time() - cpu)
+        return changed
+
+    def limit(self):
+        if len(self.baseline) < self.baseline.maxlen // 2:
+            return None
+        spread = float(np.percentile(self.baseline, 90))
+        return max(self.threshold, spread * self.margin) * self.backoff
+
+    def rejected(self):
+        # le déclenchement a redonné le morceau en cours
+        self.backoff = min(self.backoff * 2, self.MAX_BACKOFF)
+
+    def confirmed(self):
+        self.backoff = 1
+
+# --- Empreinte audio locale (bandes d'énergie, façon Haitsma-Kalker) ---
+FP_DECIMATE = 4          # 44,1 kHz -> ~11 kHz
+FP_FRAME = 2048
+FP_HOP = 512
+FP_BANDS = 17            # 16 bits par trame
+
+@functools.lru_cache(maxsize=None)
+def _fp_tables():
+    # fenêtre, bornes des bandes (en bins FFT) et poids des bits
+    window = np.hanning(FP_FRAME).astype(np.float32)
+    edges = np.unique(np.round(
+        np.geomspace(300, 2000, FP_BANDS + 1) * FP_FRAME / (SAMPLE_RATE / FP_DECIMATE)
+    ).astype(int))
+    weights = (1 << np.arange(len(edges) - 2)).astype(np.uint32)
+    return window, edges, weights
+
+def audio_fingerprint(pcm):
+    # Suite de sous-empreintes 16 bits (une toutes les ~46 ms) : signe de la
+    # dérivée temporelle des différences d'énergie entre bandes voisines
+    window, edges, weights = _fp_tables()
+    mono = pcm_frames(pcm).mean(axis=1, dtype=np.float32)
+    n = len(mono) - len(mono) % FP_DECIMATE
+    mono = mono[:n].reshape(-1, FP_DECIMATE).mean(axis=1)
+    if len(mono) < FP_FRAME + FP_HOP:
+        return np.zeros(0, dtype=np.uint16)
+    frames = np.lib.stride_tricks.sliding_window_view(mono, FP_FRAME)[::FP_HOP] * window
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+    energies = np.add.reduceat(power[:, :edges[-1]], edges[:-1], axis=1)
+    band_diff = energies[:, :-1] - energies[:, 1:]
+    bits = (band_diff[1:] - band_diff[:-1]) > 0
+    return (bits @ weights).astype(np.uint16)
+
+def fingerprint_ber(a, b):
+    # Taux d'erreur binaire entre deux empreintes alignées
+    diff = np.bitwise_xor(a, b).view(np.uint8)
+    return np.unpackbits(diff).sum() / (len(a) * 16)
+
+class RecognitionCache:
+    # Cache local empreinte audio -> piste reconnue (dict du recognizer).
+    # Persisté en SQLite, indexé en mémoire par sous-empreinte ; éviction LRU
+    # sur les pistes au-delà de max_entries.
+    MIN_OVERLAP = 40       # ~2 s de trames communes
+    MAX_SIGNATURES = 4     # empreintes gardées par piste
+
+    def __init__(self, path, max_entries, max_ber):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_ber = max_ber
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS tracks ("
+                " track_id TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " used_at REAL NOT NULL)"
+            )
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS signatures ("
+                " sig_id INTEGER PRIMARY KEY,"
+                " track_id TEXT NOT NULL,"
+                " fingerprint BLOB NOT NULL)"
+            )
+        self.tracks = {}
+        self.signatures = {}
+        self.index = {}
+        for track_id, data in self.db.execute("SELECT track_id, data FROM tracks"):
+            self.tracks[track_id] = json.loads(data)
+        for sig_id, track_id, blob in self.db.execute(
+                "SELECT sig_id, track_id, fingerprint FROM signatures"):
+            self._index(sig_id, track_id, np.frombuffer(blob, dtype=np.uint16))
+
+    def _index(self, sig_id, track_id, fp):
+        self.signatures[sig_id] = (track_id, fp)
+        for pos, value in enumerate(fp.tolist()):
+            if value not in (0, 0xFFFF):
+                self.index.setdefault(value, []).append((sig_id, pos))
+
+    def _unindex(self, sig_id):
+        track_id, fp = self.signatures.pop(sig_id)
+        for value in set(fp.tolist()):
+            entries = self.index.get(value)
+            if entries:
+                entries[:] = [e for e in entries if e[0] != sig_id]
+                if not entries:
+                    del self.index[value]
+
+    def lookup(self, fp):
+        with self.lock:
+            track_id = self._match(fp)
+            if track_id is None:
+                self.misses += 1
+                metrics.inc("kiosk_recognition_cache_total", result="miss")
+                cache_log.debug("Reconnaissance : miss (%d hits / %d miss)", self.hits, self.misses)
+                return None
+            self.hits += 1
+            metrics.inc("kiosk_recognition_cache_total", result="hit")
+            with self.db:
+                self.db.execute(
+                    "UPDATE tracks SET used_at = ? WHERE track_id = ?", (time.time(), track_id)
+                )
+            cache_log.info("Reconnaissance : hit (%d hits / %d miss)", self.hits, self.misses)
+            return self.tracks[track_id]
+
+    def _match(self, fp):
+        # Vote sur les décalages (empreinte, offset), puis vérification du
+        # taux d'erreur binaire sur la zone commune des meilleurs candidats
+        votes = {}
+        for pos, value in enumerate(fp.tolist()):
+            for sig_id, ref_pos in self.index.get(value, ()):
+                key = (sig_id, ref_pos - pos)
+                votes[key] = votes.get(key, 0) + 1
+        for (sig_id, offset), _ in sorted(votes.items(), key=lambda kv: -kv[1])[:5]:
+            track_id, ref = self.signatures[sig_id]
+            start = max(0, -offset)
+            end = min(len(fp), len(ref) - offset)
+            if end - start < self.MIN_OVERLAP:
+                continue
+            if fingerprint_ber(fp[start:end], ref[start + offset:end + offset]) <= self.max_ber:
+                return track_id
+        return None
+
+    def add(self, track, fp):
+        track_id = track.get('id')
+        if not track_id or len(fp) < self.MIN_OVERLAP:
+            return
+        with self.lock, self.db:
+            self.tracks[track_id] = track
+            self.db.execute(
+                "INSERT OR REPLACE INTO tracks (track_id, data, used_at) VALUES (?, ?, ?)",
+                (track_id, json.dumps(track), time.time())
+            )
+            cur = self.db.execute(
+                "INSERT INTO signatures (track_id, fingerprint) VALUES (?, ?)",
+                (track_id, fp.astype(np.uint16).tobytes())
+            )
+            self._index(cur.lastrowid, track_id, fp)
+
+            # on ne garde que les dernières empreintes de la piste
+            old = [row[0] for row in self.db.execute(
+                "SELECT sig_id FROM signatures WHERE track_id = ? ORDER BY sig_id DESC LIMIT -1 OFFSET ?",
+                (track_id, self.MAX_SIGNATURES)
+            )]
+            # éviction LRU des pistes
+            evicted = [row[0] for row in self.db.execute(
+                "SELECT track_id FROM tracks ORDER BY used_at DESC LIMIT -1 OFFSET ?",
+                (self.max_entries,)
+            )]
+            for evicted_id in evicted:
+                self.tracks.pop(evicted_id, None)
+                self.db.execute("DELETE FROM tracks WHERE track_id = ?", (evicted_id,))
+                old += [row[0] for row in self.db.execute(
+                    "SELECT sig_id FROM signatures WHERE track_id = ?", (evicted_id,)
+                )]
+            for sig_id in old:
+                self._unindex(sig_id)
+                self.db.execute("DELETE FROM signatures WHERE sig_id = ?", (sig_id,))
+
+_recognition_cache = None
+
+def get_recognition_cache():
+    # chargé au premier passage en Bluetooth (index en mémoire + NumPy)
+    global _recognition_cache
+    if _recognition_cache is None:
+        _recognition_cache = RecognitionCache(
+            os.path.join(CACHE_DIR, "recognition.sqlite"), RECOGNITION_CACHE_SIZE, RECOGNITION_MAX_BER
+        )
+    return _recognition_cache
+
+class SessionHTTPClient:
+    # Client HTTP pour shazamio qui garde une seule session aiohttp ouverte
+    # (shazamio en ouvre une nouvelle à chaque requête par défaut)
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.session = None
+
+    async def request(self, method, url, *args, **kwargs):
+        if SHAZAM_URL:
+            # point d'accès de remplacement (serveur local de test/mesure)
+            parts = urllib.parse.urlsplit(url)
+            url = SHAZAM_URL.rstrip("/") + urllib.parse.urlunsplit(("", "", parts.path, parts.query, ""))
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        async with self.session.request(method, url, *args, **kwargs) as resp:
+            resp.raise_for_status()
+            return await resp.json(content_type=None)
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+class RecognitionClient:
+    # Boucle asyncio persistante dans un thread dédié : le client Shazam et
+    # sa session HTTP sont créés une fois puis réutilisés. Chaque requête a un
+    # délai maximal et les échecs sont retentés avec un backoff aléatoire.
+    def __init__(self, timeout, retries, backoff):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.shazam = None
+        self.http = None
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self._run_loop, daemon=True).start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def _client(self):
+        if self.shazam is None:
+            self.http = SessionHTTPClient(self.timeout)
+            try:
+                self.shazam = shazamio.Shazam(http_client=self.http)
+            except TypeError:
+                # shazamio < 0.6 : pas de client HTTP injectable
+                self.http = None
+                self.shazam = shazamio.Shazam()
+        return self.shazam
+
+    async def _recognize(self, audio):
+        shazam = self._client()
+        for attempt in range(self.retries + 1):
+            try:
+                return await asyncio.wait_for(shazam.recognize(audio), self.timeout)
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = random.uniform(0.5, 1.0) * self.backoff * (2 ** attempt)
+                shazam_log.warning("Échec (%r), nouvel essai dans %.1f s", e, delay)
+                await asyncio.sleep(delay)
+
+    def recognize(self, audio):
+        # Appel bloquant depuis un thread ; délai global borné
+        deadline = (self.timeout + self.backoff * (2 ** self.retries)) * (self.retries + 1)
+        start = time.perf_counter()
+        future = asyncio.run_coroutine_threadsafe(self._recognize(audio), self.loop)
+        try:
+            data = future.result(timeout=deadline)
+        except Exception:
+            future.cancel()
+            metrics.since("kiosk_shazam_seconds", start)
+            metrics.inc("kiosk_shazam_requests_total", result="error")
+            raise
+        metrics.since("kiosk_shazam_seconds", start)
+        metrics.inc("kiosk_shazam_requests_total", result="match" if data.get('track') else "nomatch")
+        return data
+
+    def close(self):
+        if self.http:
+            asyncio.run_coroutine_threadsafe(self.http.close(), self.loop)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+_recognition_client = None
+
+def get_recognition_client():
+    global _recognition_client
+    if _recognition_client is None:
+        _recognition_client = RecognitionClient(SHAZAM_TIMEOUT, SHAZAM_RETRIES, SHAZAM_BACKOFF)
+    return _recognition_client
+
 class BluetoothRecognizer:
     WAIT_MUSIC   = 0
     RECOGNIZE    = 1
     WAIT_SILENCE = 2
     
-    def __init__(self, ui_callback):
+    def __init__(self, ui_callback, on_music=lambda: None):
         self.ui_callback = ui_callback
-        self.shazam = Shazam()
+        self.on_music = on_music
+        self.client = get_recognition_client()
         self.last_track_id = None
-        self.loop_running = False
+        self.token = None
+        self.capture = None
+        self.music_since = None
+        self.music_started = None
+        self._last_probe = None
+        self.analyzed = 0
+        self.window = SAMPLE_RATE * LEVEL_WINDOW_MS // 1000
+        self.gate = LevelGate(
+            SILENCE_THRESHOLD * SILENCE_HYSTERESIS, SILENCE_THRESHOLD,
+            max(1, LEVEL_HOLD_MS // LEVEL_WINDOW_MS)
+        )
+        self.novelty = None
+        if NOVELTY_ENABLED:
+            self.novelty = NoveltyDetector(
+                NOVELTY_THRESHOLD, NOVELTY_RECENT, NOVELTY_HISTORY, NOVELTY_HOLD,
+                NOVELTY_MARGIN, NOVELTY_BASELINE
+            )
+        self.novelty_triggered = False
 
-    async def recognize_song(self, filepath):
+    def recognize_song(self, audio):
         try:
-            data = await self.shazam.recognize(filepath)
+            data = self.client.recognize(audio)
             track = data.get('track', {})
             if track:
                 return {
@@ -129,30 +2298,48 @@ class BluetoothRecognizer:
                     'id': track.get('key')
                 }
         except Exception as e:
-            print(f"Erreur Shazam: {e}")
+            shazam_log.error("Erreur Shazam : %r", e)
         return None
 
+    @property
+    def loop_running(self):
+        return self.token is not None and not self.token.cancelled
+
     def start(self):
         if self.loop_running:
             return
-        self.loop_running = True
+        # nouvelle génération : les workers Bluetooth précédents sont annulés
+        _, self.token = workers.start_generation("Bluetooth")
         self.state = self.WAIT_MUSIC
-        threading.Thread(target=self.loop, daemon=True).start()
+        self.capture = AudioCapture(PCM, RECOGNITION_SCHEDULE[-1] + CAPTURE_MARGIN)
+        self.capture.start()
+        workers.spawn("Bluetooth", self.loop, token=self.token)
 
     def stop(self):
-        self.loop_running = False
+        if self.token:
+            self.token.cancel()
+        if self.capture:
+            self.capture.stop()
 
     def loop(self):
         silence_started_at = None
 
+        # on attend d'avoir une première sonde complète
+        self.capture.wait_until(self.capture.bytes_per_second * CHECK_DURATION)
+
         while self.loop_running:
-            # --- SONDE COURTE ---
-            self.record_audio(TMP, CHECK_DURATION)
-            silent = self.check_silence(TMP)
+            # --- SONDE COURTE (audio arrivé depuis la dernière analyse) ---
+            pcm = self._new_audio()
+            silent = self.check_silence(pcm)
 
             if self.state == self.WAIT_MUSIC:
                 # ↳ on attend simplement du son
                 if not silent:
+                    self.on_music()
+                    self.music_since = self._music_onset()
+                    behind = (self.capture.position - self.music_since) / self.capture.bytes_per_second
+                    self.music_started = time.perf_counter() - behind
+                    self.novelty_triggered = False
                     self.state = self.RECOGNIZE          # son détecté
                     continue
 
@@ -172,29 +2359,73 @@ class BluetoothRecognizer:
                         # blanc assez long ⇒ on repart de zéro
                         self.state = self.WAIT_MUSIC
                         silence_started_at = None
+                        if self.novelty:
+                            self.novelty.reset()
                         # on ne remet PAS last_track_id à None pour éviter
                         # les doublons si la même chanson reprend
                 else:
                     silence_started_at = None  # reset si bruit
-
-            time.sleep(0.3)   # cadence de sondage très réactive
+                    if self.novelty and self.novelty.update(pcm):
+                        # enchaînement sans blanc : le nouveau morceau a
+                        # commencé il y a environ NOVELTY_RECENT s
+                        bluetooth_log.info("Changement de morceau détecté sans blanc")
+                        metrics.inc("kiosk_novelty_triggers_total")
+                        capture = self.capture
+                        back = int(NOVELTY_RECENT * capture.bytes_per_second)
+                        self.music_since = capture.position - back + back % capture.frame_size
+                        self.music_started = time.perf_counter() - NOVELTY_RECENT
+                        self.novelty_triggered = True
+                        self.state = self.RECOGNIZE
+                        continue
+
+            self.token.wait(0.3)   # cadence de sondage très réactive
 
     # ---------------- helper Shazam ------------------
     def _run_shazam(self):
-        print("🎧 Musique détectée, interrogation Shazam…")
-        self.record_audio(TMP, DURATION_SHAZAM)
-        track = asyncio.run(self.recognize_song(TMP))
+        bluetooth_log.info("Musique détectée, interrogation Shazam…")
+        # Échantillons de plus en plus longs (RECOGNITION_SCHEDULE) tant que
+        # rien n'est trouvé. Ils sont pris directement dans le tampon : on
+        # n'attend que ce qui manque depuis le début de la musique.
+        track = None
+        attempt = 0
+        for seconds in RECOGNITION_SCHEDULE[:RECOGNITION_MAX_ATTEMPTS]:
+            attempt += 1
+            needed = int(self.capture.bytes_per_second * seconds)
+            self.capture.wait_until(self.music_since + needed)
+            if not self.loop_running:
+                return
+            pcm = self.capture.latest(seconds)
+            fp = audio_fingerprint(pcm)
+            track = get_recognition_cache().lookup(fp)
+            if track is None:
+                track = self.recognize_song(pcm_to_wav(pcm))
+                if track:
+                    get_recognition_cache().add(track, fp)
+            if not self.loop_running:
+                return                                  # résultat périmé
+            if track:
+                break
+            bluetooth_log.debug("Rien avec %.0f s d'échantillon (essai %d)", seconds, attempt)
+        metrics.since(
+            "kiosk_time_to_identify_seconds", self.music_started,
+            result="match" if track else "nomatch", attempts=str(attempt)
+        )
 
         if track:
             if track['id'] != self.last_track_id:
                 self.last_track_id = track['id']
                 self.ui_callback(track)
-                print(f"🎶 {track['artist']} – {track['title']}")
+                bluetooth_log.info("%s – %s", track["artist"], track["title"])
+                if self.novelty:
+                    self.novelty.confirmed()
             else:
-                print("Même piste qu’avant ; on ignore.")
+                bluetooth_log.debug("Même piste qu’avant ; on ignore.")
+                if self.novelty and self.novelty_triggered:
+                    # fausse alerte : le détecteur devient plus exigeant
+                    self.novelty.rejected()
             self.state = self.WAIT_SILENCE             # on attend le prochain blanc
         else:
-            print("Aucun titre trouvé. Réinitialisation de l’affichage.")
+            bluetooth_log.info("Aucun titre trouvé. Réinitialisation de l’affichage.")
             self.last_track_id = None
             self.ui_callback({
                 'title': "Mode enceinte Bluetooth !",
@@ -204,18 +2435,472 @@ class BluetoothRecognizer:
             })
             self.state = self.WAIT_SILENCE              # on ré-écoute le son
 
-    def record_audio(self, filepath, duration):
-        subprocess.run([
-            "arecord", "-D", PCM, "-f", "S16_LE", "-r", "44100", "-c", "2",
-            "-d", str(duration), filepath
-        ], check=True)
+    def _new_audio(self):
+        capture = self.capture
+        end = capture.position - capture.position % capture.frame_size
+        start = max(self.analyzed, end - capture.bytes_per_second * CHECK_DURATION)
+        pcm = capture.read(start, end)
+        # on garde le reste d'une fenêtre incomplète pour la prochaine sonde
+        usable = len(pcm) - len(pcm) % (self.window * capture.frame_size)
+        self.analyzed = start + usable
+        return pcm[:usable]
+
+    def _music_onset(self):
+        # Remonte le tampon par blocs d'1/2 s jusqu'au dernier blanc :
+        # si la musique jouait déjà, l'échantillon est disponible tout de suite
+        capture = self.capture
+        frames = pcm_frames(capture.latest(capture.capacity / capture.bytes_per_second))
+        block = SAMPLE_RATE // 2
+        rms, _, _ = window_levels(frames[len(frames) % block:], block)
+        loud = rms.max(axis=1) >= SILENCE_THRESHOLD
+        quiet = np.flatnonzero(~loud)
+        music_blocks = len(loud) - (quiet[-1] + 1 if len(quiet) else 0)
+        return capture.position - music_blocks * block * capture.frame_size
+
+    def check_silence(self, pcm_data):
+        now = time.perf_counter()
+        if self._last_probe is not None:
+            metrics.observe("kiosk_level_probe_interval_seconds", now - self._last_probe)
+        self._last_probe = now
+        if not pcm_data:
+            return not self.gate.music
+        rms, peak, crest = window_levels(pcm_frames(pcm_data), self.window)
+        music = self.gate.update(rms)
+        bluetooth_log.debug("Niveau RMS: %.0f crête: %.0f facteur de crête: %.1f", rms.max(), peak.max(), crest.max())
+        return not music
+
+def recognizer_process_main(events, stop):
+    # Point d'entrée du processus de reconnaissance (contexte spawn) : un
+    # BluetoothRecognizer ordinaire dont les callbacks, logs et métriques
+    # passent par la file `events`
+    log.removeHandler(log_handler)
+    log.addHandler(logging.handlers.QueueHandler(events))
+    metrics.forward = events.put
+    recognizer = BluetoothRecognizer(
+        lambda track: events.put(("track", track)),
+        on_music=lambda: events.put(("music", None)),
+    )
+    recognizer.start()
+    parent = multiprocessing.parent_process()
+    # on s'arrête aussi si le parent disparaît sans prévenir
+    while not stop.wait(1):
+        if parent is not None and not parent.is_alive():
+            break
+    recognizer.stop()
+    if _recognition_client is not None:
+        _recognition_client.close()
+
+class RecognizerProcess:
+    # Même interface que BluetoothRecognizer, mais capture, analyse de
+    # niveau, empreintes et Shazam tournent dans un processus à part : plus
+    # de concurrence avec Tk pour le GIL. Un worker du groupe "Bluetooth"
+    # supervise le fils, redistribue ses événements et le relance s'il
+    # meurt ; quitter la source l'arrête proprement.
+    STOP_TIMEOUT = 3
+    MAX_BACKOFF = 30
+
+    def __init__(self, ui_callback, on_music=lambda: None):
+        self.ui_callback = ui_callback
+        self.on_music = on_music
+        self.token = None
+
+    @property
+    def loop_running(self):
+        return self.token is not None and not self.token.cancelled
+
+    def start(self):
+        if self.loop_running:
+            return
+        _, self.token = workers.start_generation("Bluetooth")
+        workers.spawn("Bluetooth", self._supervise, self.token, token=self.token)
+
+    def stop(self):
+        if self.token:
+            self.token.cancel()
+
+    def _supervise(self, token):
+        context = multiprocessing.get_context("spawn")
+        backoff = 1
+        while not token.cancelled:
+            events = context.Queue()
+            stop = context.Event()
+            process = context.Process(
+                target=recognizer_process_main, args=(events, stop), name="kiosk-recognizer", daemon=True
+            )
+            started = time.monotonic()
+            process.start()
+            bluetooth_log.info("Processus de reconnaissance démarré (pid %d)", process.pid)
+            while process.is_alive() and not token.cancelled:
+                try:
+                    self._dispatch(events.get(timeout=0.3), token)
+                except queue.Empty:
+                    pass
+            if token.cancelled:
+                stop.set()
+                process.join(self.STOP_TIMEOUT)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+                break
+            # ce que le fils a envoyé avant de mourir (logs de l'erreur…)
+            try:
+                while True:
+                    self._dispatch(events.get(timeout=0.1), token)
+            except queue.Empty:
+                pass
+            if time.monotonic() - started > 60:
+                backoff = 1
+            bluetooth_log.warning(
+                "Processus de reconnaissance arrêté (code %s), relance dans %d s", process.exitcode, backoff
+            )
+            metrics.inc("kiosk_recognizer_restarts_total")
+            token.wait(backoff)
+            backoff = min(backoff * 2, self.MAX_BACKOFF)
 
-    def check_silence(self, filepath):
-        with open(filepath, "rb") as f:
-            pcm_data = f.read()
-        rms = audioop.rms(pcm_data, 2)
-        print(f"Niveau RMS: {rms}")
-        return rms < SILENCE_THRESHOLD
+    def _dispatch(self, event, token):
+        if isinstance(event, logging.LogRecord):
+            logging.getLogger(event.name).handle(event)
+            return
+        kind, payload = event
+        if kind == "metric":
+            method, name, value, labels = payload
+            getattr(metrics, method)(name, value, **labels)
+        elif token.cancelled:
+            return                                      # résultat périmé
+        elif kind == "track":
+            self.ui_callback(payload)
+        elif kind == "music":
+            self.on_music()
+
+def make_bluetooth_recognizer(ui_callback, on_music=lambda: None):
+    cls = RecognizerProcess if RECOGNIZER_PROCESS else BluetoothRecognizer
+    return cls(ui_callback, on_music=on_music)
+
+class SourceManager:
+    # Machine à états des sources (IDLE -> SWITCHING -> ACTIVE). Les
+    # transitions tournent dans un thread dédié : l'arrêt de l'ancienne source
+    # et la préparation de la nouvelle se font en parallèle, puis l'UI est
+    # prévenue via le dispatcher. Des appuis rapprochés se résument au dernier.
+    # L'état de l'app n'est touché que par le thread Tk : il détache lui-même
+    # les lecteurs à arrêter et les passe à select(), qui ne fait que les
+    # stopper.
+    IDLE = "idle"
+    SWITCHING = "switching"
+    ACTIVE = "active"
+
+    def __init__(self, app):
+        self.app = app
+        self.state = self.IDLE
+        self.current = None
+        self.generation = 0
+        self._requested = None
+        self._stopping = []
+        self._cond = threading.Condition()
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="source"
+        )
+        self._spotify_volume = None
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def select(self, name, stopping=()):
+        with self._cond:
+            self.generation += 1
+            self._requested = (name, self.generation)
+            # cumulés : un appui remplacé doit quand même arrêter les siens
+            self._stopping.extend(stopping)
+            self._cond.notify()
+
+    def is_current(self, generation):
+        return generation == self.generation
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._requested is None:
+                    self._cond.wait()
+                name, generation = self._requested
+                stopping, self._stopping = self._stopping, []
+                self._requested = None
+            self._transition(name, generation, stopping)
+
+    def _transition(self, new, generation, stopping):
+        old = self.current
+        self.state = self.SWITCHING
+        start = time.time()
+        tapped = time.perf_counter()
+        if old == new:
+            # même source : on la redémarre proprement
+            self._safe(self._teardown, old, new, stopping)
+            self._safe(self._prepare, new, old)
+        else:
+            steps = [
+                self._pool.submit(self._safe, self._teardown, old, new, stopping),
+                self._pool.submit(self._safe, self._prepare, new, old),
+            ]
+            concurrent.futures.wait(steps)
+        self.current = new
+        self.state = self.ACTIVE
+        source_log.info("%s -> %s en %.0f ms", old, new, (time.time() - start) * 1000)
+        metrics.since("kiosk_source_switch_seconds", tapped, source=new.lower())
+        self.app.dispatcher.post(lambda: self.app._on_source_ready(new, generation), key="source")
+
+    def _safe(self, step, *args):
+        try:
+            step(*args)
+        except Exception as e:
+            source_log.error("Erreur %s %s : %r", step.__name__, args, e)
+
+    # --- arrêt de l'ancienne source ---
+    def _teardown(self, old, new, stopping):
+        # moteur CD, reconnaissance Bluetooth… détachés par le thread Tk
+        for player in stopping:
+            player.stop()
+        if (old == "Spotify" or old is None) and new != "Spotify":
+            if KEEP_SPOTIFYD_WARM:
+                self._mute_spotifyd()
+            else:
+                self.stop_spotifyd()
+        if old == "Bluetooth" or old is None:
+            if new != "Bluetooth":
+                subprocess.run(['bluetoothctl', 'power', 'off'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    # --- préparation de la nouvelle source ---
+    def _prepare(self, new, old):
+        if new == "CD":
+            Gst.load()
+        elif new == "Spotify":
+            self.start_spotifyd()
+            self._unmute_spotifyd()
+        elif new == "Bluetooth":
+            try:
+                lsmod = subprocess.check_output(['lsmod']).decode()
+                if 'snd_aloop' not in lsmod:
+                    subprocess.run(['sudo', 'modprobe', 'snd-aloop'])
+            except Exception as e:
+                source_log.warning("Impossible de charger snd-aloop : %s", e)
+            subprocess.run(['bluetoothctl', 'power', 'on'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    # --- spotifyd ---
+    def start_spotifyd(self):
+        # Lance spotifyd si pas déjà lancé
+        if not hasattr(self, "_spotifyd_proc") or self._spotifyd_proc.poll() is not None:
+            self._spotify_volume = None
+            self._spotifyd_proc = subprocess.Popen(
+                ["/usr/local/bin/spotifyd", "--no-daemon", "--config-path", "/home/player/.config/spotifyd/spotifyd.conf"]
+            )
+
+    def stop_spotifyd(self):
+        if hasattr(self, "_spotifyd_proc") and self._spotifyd_proc.poll() is None:
+            self._spotifyd_proc.terminate()
+
+    def _spotify_player(self):
+        bus = pydbus.SessionBus()
+        name = get_spotifyd_mpris_name(bus)
+        return bus.get(name, SpotifySource.MPRIS_PATH) if name else None
+
+    def _mute_spotifyd(self):
+        # spotifyd reste lancé (connexion Spotify Connect gardée) mais muet
+        player = self._spotify_player()
+        if player is None:
+            return
+        if player.PlaybackStatus == "Playing":
+            player.Pause()
+        if self._spotify_volume is None:
+            self._spotify_volume = player.Volume
+        player.Volume = 0.0
+
+    def _unmute_spotifyd(self):
+        if self._spotify_volume is None:
+            return
+        player = self._spotify_player()
+        if player is not None:
+            player.Volume = self._spotify_volume
+        self._spotify_volume = None
+
+class VolumeEngine:
+    # Un seul volume pour toutes les sources. Le curseur ne fait que poser
+    # une cible ; un thread dédié y rampe par pas de STEP_MS en ne gardant
+    # que la dernière valeur demandée (un glisser = quelques écritures, pas
+    # une par graduation).
+    #  - mode "alsa" : mixer de la carte de sortie via un `amixer -s`
+    #    persistant, donc CD, spotifyd et Bluetooth d'un coup
+    #  - mode "software" (ou contrôle ALSA absent / amixer indisponible) :
+    #    élément volume du pipeline CD, et volume MPRIS de spotifyd quand il
+    #    joue
+    # Le contrôle ALSA est sondé une fois au démarrage ; tant qu'il n'est pas
+    # confirmé, l'élément volume garde le niveau logiciel.
+    STEP_MS = 5
+
+    def __init__(self, mode, card, control, ramp_ms, volume):
+        self.mode = mode
+        self.card = card
+        self.control = control
+        self.ramp_ms = ramp_ms
+        self.target = volume / 100.0
+        self.level = None
+        self.element = None
+        self.source = None
+        self.spotify_player = lambda: None
+        self.mixer = None
+        self.mixer_ok = False
+        self.cond = threading.Condition()
+        threading.Thread(target=self._run, name="volume", daemon=True).start()
+
+    def set(self, volume):
+        with self.cond:
+            self.target = volume / 100.0
+            self.cond.notify()
+
+    def attach_element(self, element):
+        # référence gardée une fois pour toutes (pas de get_by_name par tick)
+        with self.cond:
+            self.element = element
+            level = self.target if self.level is None else self.level
+            unity = self.mode == "alsa" and self.mixer_ok
+        if element is not None:
+            element.set_property("volume", 1.0 if unity else level)
+
+    def set_source(self, source):
+        with self.cond:
+            self.source = source
+            # spotifyd a son propre volume : on le réaligne au prochain tour
+            if self.mode != "alsa":
+                self.level = None
+            self.cond.notify()
+
+    def _probe_mixer(self):
+        try:
+            subprocess.run(
+                ["amixer", "-c", self.card, "sget", self.control],
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                timeout=5, check=True
+            )
+        except subprocess.CalledProcessError as e:
+            self._fallback((e.stderr or "").strip() or f"code {e.returncode}")
+            return
+        except (OSError, subprocess.TimeoutExpired) as e:
+            self._fallback(e)
+            return
+        with self.cond:
+            self.mixer_ok = True
+            element = self.element
+        ui_log.info("Volume sur le mixer ALSA %s/%s", self.card, self.control)
+        # le mixer porte désormais le volume : pipeline CD au gain unité
+        if element is not None:
+            element.set_property("volume", 1.0)
+
+    def _fallback(self, reason):
+        ui_log.warning("Mixer ALSA %s/%s indisponible (%s), volume logiciel",
+                       self.card, self.control, reason)
+        with self.cond:
+            self.mode = "software"
+            self.mixer_ok = False
+            element = self.element
+            level = self.target if self.level is None else self.level
+        if element is not None:
+            element.set_property("volume", level)
+
+    def _run(self):
+        if self.mode == "alsa":
+            self._probe_mixer()
+        while True:
+            with self.cond:
+                while self.level is not None and abs(self.target - self.level) < 0.001:
+                    self.cond.wait()
+                target = self.target
+                start = target if self.level is None else self.level
+            steps = max(1, self.ramp_ms // self.STEP_MS)
+            for i in range(1, steps + 1):
+                level = start + (target - start) * i / steps
+                self._apply(level)
+                with self.cond:
+                    self.level = level
+                    if self.target != target:
+                        break
+                if i < steps:
+                    time.sleep(self.STEP_MS / 1000)
+            else:
+                self._apply_spotify(target)
+
+    def _apply(self, level):
+        if self.mode == "alsa" and self._mixer_write(f"sset {self.control} {level * 100:.1f}%\n"):
+            return
+        if self.element is not None:
+            self.element.set_property("volume", level)
+
+    def _mixer_write(self, command):
+        if self.mixer is not None and self.mixer.poll():
+            # amixer -s sorti en erreur (contrôle disparu…) : pas de relance en boucle
+            self._fallback(f"amixer sorti avec le code {self.mixer.returncode}")
+            return False
+        try:
+            if self.mixer is None or self.mixer.poll() is not None:
+                self.mixer = subprocess.Popen(
+                    ["amixer", "-q", "-M", "-s", "-c", self.card],
+                    stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                    text=True, bufsize=1
+                )
+            self.mixer.stdin.write(command)
+            return True
+        except OSError as e:
+            # pas de mixer utilisable : repli sur le volume logiciel
+            self._fallback(e)
+            return False
+
+    def _apply_spotify(self, level):
+        if self.mode == "alsa" or self.source != "Spotify":
+            return
+        try:
+            player = self.spotify_player()
+            if player is not None:
+                player.Volume = level
+        except Exception as e:
+            spotify_log.warning("Volume spotifyd : %s", e)
+
+class UiDispatcher:
+    # File unique entre les autres threads (GLib/GStreamer, workers, boucle
+    # asyncio) et le thread Tk. post() ne fait que remplir la file : seul le
+    # thread Tk appelle Tk, via un after() qui se réarme à chaque trame et
+    # vide la file si besoin. Les mises à jour qui portent la même clé se
+    # remplacent et seule la plus récente est appliquée.
+    def __init__(self, widget, frame_ms):
+        self.widget = widget
+        self.frame_ms = frame_ms
+        self.lock = threading.Lock()
+        self.pending = OrderedDict()
+        self._seq = 0
+        # construit sur le thread Tk
+        self.widget.after(self.frame_ms, self._flush)
+
+    def post(self, fn, key=None):
+        with self.lock:
+            if key is None:
+                self._seq += 1
+                key = ("seq", self._seq)
+            else:
+                self.pending.pop(key, None)
+            self.pending[key] = (fn, time.perf_counter())
+
+    def _flush(self):
+        try:
+            with self.lock:
+                batch = self.pending
+                if batch:
+                    self.pending = OrderedDict()
+            if not batch:
+                return
+            now = time.perf_counter()
+            for fn, posted in batch.values():
+                metrics.observe("kiosk_ui_queue_lag_seconds", now - posted)
+                try:
+                    fn()
+                except Exception as e:
+                    ui_log.exception("Erreur mise à jour : %r", e)
+        finally:
+            try:
+                self.widget.after(self.frame_ms, self._flush)
+            except tk.TclError:
+                pass        # fenêtre détruite pendant la trame
 
 class MusicKioskApp(tk.Tk):
     def __init__(self):
@@ -224,8 +2909,11 @@ class MusicKioskApp(tk.Tk):
         self.attributes('-fullscreen', True)
         self.configure(background='black')
 
-        # GStreamer pipeline & state
-        self.cd_pipeline = None
+        # Toutes les mises à jour venant d'autres threads passent par ici
+        self.dispatcher = UiDispatcher(self, UI_FRAME_MS)
+
+        # Moteur de lecture CD (pipeline GStreamer persistant)
+        self.cd_engine = None
 
         self.track_index = 1
         self.cd_playing = False
@@ -234,8 +2922,11 @@ class MusicKioskApp(tk.Tk):
         self.last_artist_album = ""
         self.last_discid = None
         self.tracks_info = []
+        self.disc_session = None
+        self.last_disc_session = None
 
         self.volume = 40
+        self.volume_engine = VolumeEngine(VOLUME_MODE, MIXER_CARD, MIXER_CONTROL, VOLUME_RAMP_MS, self.volume)
 
         # -- Cadre principal horizontal
         self.main_frame = tk.Frame(self, bg='black')
@@ -317,6 +3008,7 @@ class MusicKioskApp(tk.Tk):
         # -- 2. Frame des icônes sources, à droite (vertical)
         self.icon_frame = tk.Frame(self.main_frame, bg='black')
         self.icon_frame.pack(side='right', fill='y', padx=30, pady=20)
+        icons_start = time.perf_counter()
         sources = [
             ("CD",        "cd.png"),
             ("Spotify",   "spotify.png"),
@@ -328,7 +3020,7 @@ class MusicKioskApp(tk.Tk):
                 img = Image.open(img_path).resize((90, 90), Image.LANCZOS)
                 photo = ImageTk.PhotoImage(img)
             except Exception as e:
-                print(f"[WARN] Impossible de charger l'icône '{img_path}' : {e}")
+                ui_log.warning("Impossible de charger l'icône '%s' : %s", img_path, e)
                 placeholder = Image.new("RGB", (90, 90), color=(50, 50, 50))
                 photo = ImageTk.PhotoImage(placeholder)
             btn = tk.Button(
@@ -341,46 +3033,84 @@ class MusicKioskApp(tk.Tk):
             )
             btn.image = photo
             btn.grid(row=idx, column=0, pady=30)
+        startup_profile.record("icônes des sources", icons_start, time.perf_counter())
         self.status_label = tk.Label(self.content_frame, text="Sélectionnez une source", fg='#AAA', bg='black', font=('Helvetica', 12))
         self.status_label.pack(pady=(6, 0))
         self.current_track_id = None
-        self.sp = None    
+        self.sp = None
+        self.image_loader = ImageLoader(IMAGE_WORKERS)
+        self.spotify_source = None
+        self.avrcp_source = None
+        self.bluetooth_recognizer = None
+        self._tap_pending = None
+        self.source_manager = SourceManager(self)
+        self.volume_engine.spotify_player = self.source_manager._spotify_player
 
     def show_cd_controls(self):
-        self.controls_and_volume_frame.pack(pady=(8, 0), fill='x')
-        self.ctrl_frame.pack(side='top', pady=(0, 6), fill='x')
-        self.volume_scale.pack(side='top', fill='x', padx=20)
+        self.ctrl_frame.pack(side='top', pady=(0, 6), fill='x', before=self.volume_scale)
 
     def hide_cd_controls(self):
-        self.controls_and_volume_frame.pack_forget()
+        # le volume reste accessible pour toutes les sources
+        self.ctrl_frame.pack_forget()
+
+    def report_callback_exception(self, exc_type, exc, tb):
+        # Exceptions des callbacks Tk : dans le journal plutôt que sur stderr
+        ui_log.error("Erreur dans un callback Tk", exc_info=(exc_type, exc, tb))
     
     def select_source(self, source_name):
-        # Arrête l’update Spotify si on change de source
-        if hasattr(self, '_spotify_update_running'):
-            self._spotify_update_running = False
+        # Accusé immédiat ; la transition elle-même tourne en tâche de fond
+        self._tap_pending = (source_name, time.perf_counter())
+        if self.spotify_source:
+            self.spotify_source.stop()
+            self.spotify_source = None
+        if self.avrcp_source:
+            self.avrcp_source.stop()
+            self.avrcp_source = None
         self.title_label.config(text=f"Source : {source_name}")
+        self.status_label.config(text="Changement de source…")
         self.artist_label.config(text="")
         self.album_label.config(text="")
         self.album_canvas.delete("all")
-        self._stop_cd_process()
-        subprocess.run(['bluetoothctl', 'power', 'off'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        self.stop_spotifyd()
+        if self.disc_session:
+            self._save_cd_state()
+            self.last_disc_session = self.disc_session
+        self.disc_session = None
+        self.image_loader.cancel()
+        # tous les workers de l'ancienne source deviennent périmés
+        workers.cancel("CD")
+        workers.cancel("Bluetooth")
+        workers_log.debug("%d actifs au changement de source", workers.active_count())
+        # arrêtés par le SourceManager ; le pipeline CD est gardé pour la suite
+        stopping = []
+        if self.cd_engine:
+            stopping.append(self.cd_engine)
+        self.cd_playing = False
+        if self.bluetooth_recognizer:
+            stopping.append(self.bluetooth_recognizer)
+            self.bluetooth_recognizer = None
         if source_name == "CD":
             self.show_cd_controls()
+        else:
+            self.hide_cd_controls()
+        self.source_manager.select(source_name, stopping)
+
+    def mark_first_audio(self, source_name):
+        # Appelé (depuis n'importe quel thread) quand la source produit du son
+        pending = self._tap_pending
+        if pending and pending[0] == source_name:
+            self._tap_pending = None
+            metrics.since("kiosk_first_audio_seconds", pending[1], source=source_name.lower())
+
+    def _on_source_ready(self, source_name, generation):
+        if not self.source_manager.is_current(generation):
+            return
+        self.status_label.config(text="")
+        self.volume_engine.set_source(source_name)
+        if source_name == "CD":
             self.play_cd()
         elif source_name == "Spotify":
-            self.hide_cd_controls()
-            self.start_spotifyd()
             self.play_spotify()
         elif source_name == "Bluetooth":
-            try:
-                lsmod = subprocess.check_output(['lsmod']).decode()
-                if 'snd_aloop' not in lsmod:
-                    subprocess.run(['sudo', 'modprobe', 'snd-aloop'])
-            except Exception as e:
-                print(f"[WARN] Impossible de charger snd-aloop : {e}")
-            subprocess.run(['bluetoothctl', 'power', 'on'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            self.hide_cd_controls()
             self.play_bluetooth()
 
     def play_cd(self):
@@ -390,135 +3120,79 @@ class MusicKioskApp(tk.Tk):
         self.album_label.config(text="")
         self.album_canvas.delete("all")
 
-        def fetch_and_display():
-            print("== Début fetch_and_display ==")
-            try:
-                titre_album, artiste_principal, mbid, release_obj = fetch_album_metadata()
-                print(f"Metadata récupérées: {titre_album}, {artiste_principal}, {mbid}")
-            except Exception as e:
-                print(f"[Erreur fetch_album_metadata] {e}")
-                self.after(0, lambda err=e: self.title_label.config(
-                    text=f"Erreur lecteur CD : {err}"))
-                return
+        # Une seule lecture de TOC ; l'UI se remplit au fil de l'eau :
+        # numéros de piste, puis titres, puis pochette
+        _, token = workers.start_generation("CD")
+        self.disc_session = DiscSession(CD_DEVICE, token, previous=self.last_disc_session)
+        self.disc_session.start(
+            on_toc=lambda s: self.dispatcher.post(lambda: self._on_disc_toc(s)),
+            on_metadata=lambda s, m: self.dispatcher.post(lambda: self._on_disc_metadata(s, m)),
+            on_cover=lambda s, c: self.dispatcher.post(lambda: self._on_disc_cover(s, c), key="cover"),
+            on_error=lambda s, e: self.dispatcher.post(lambda: self._on_disc_error(s, e)),
+        )
 
-            # On prépare la tracklist et les infos
-            try:
-                print("== Début récupération infos disque ==")
-                try:
-                    disc = discid.read(CD_DEVICE)
-                    num_tracks = disc.last_track_num
-                    disc_id = disc.id
-                    disc_number = str(getattr(disc, 'disc_number', 1))
-                    print(f"Infos CD: num_tracks={num_tracks}, disc_id={disc_id}, disc_number={disc_number}")
-                except Exception as e:
-                    print(f"[Erreur discid.read] {e}")
-                    num_tracks = 1
-                    disc_id = None
-                    disc_number = "1"
-
-                medium_list = release_obj.get("medium-list", []) if release_obj else []
-                print(f"medium_list: {medium_list}")
-                selected_medium = None
-
-                if disc_id:
-                    for medium in medium_list:
-                        disc_list = medium.get("disc-list", [])
-                        if any(d.get("id") == disc_id for d in disc_list):
-                            selected_medium = medium
-                            break
-                if not selected_medium:
-                    for medium in medium_list:
-                        if medium.get("position") == disc_number:
-                            selected_medium = medium
-                            break
-                if not selected_medium and medium_list:
-                    selected_medium = medium_list[0]
-
-                print(f"selected_medium: {selected_medium}")
-
-                # Tracklist
-                tracks_info = []
-                if selected_medium and selected_medium.get("track-list"):
-                    for track in selected_medium["track-list"]:
-                        titre_piste = track.get("recording", {}).get("title", "Titre inconnu")
-                        artist_credits = track.get("artist-credit", [])
-                        artiste_piste = " & ".join(
-                            ac.get("artist", {}).get("name", "") for ac in artist_credits if ac.get("artist", {})
-                        ) or artiste_principal
-                        duree = track.get("length", None)
-                        if duree:
-                            minutes = int(duree) // 60000
-                            secondes = (int(duree) % 60000) // 1000
-                            duree_fmt = f"{minutes}:{secondes:02d}"
-                        else:
-                            duree_fmt = "--:--"
-                        num_str = track.get("number", "").lstrip("0") or "?"
-                        try:
-                            num = int(num_str)
-                        except ValueError:
-                            num = None
-                        tracks_info.append({
-                            "num": num if num else len(tracks_info) + 1,
-                            "titre": titre_piste,
-                            "artiste": artiste_piste,
-                            "duree_fmt": duree_fmt
-                        })
-                    # Complète si la base MB est incomplète
-                    while len(tracks_info) < num_tracks:
-                        tracks_info.append({
-                            "num": len(tracks_info) + 1,
-                            "titre": f"Piste {len(tracks_info) + 1}",
-                            "artiste": artiste_principal,
-                            "duree_fmt": "--:--"
-                        })
-                else:
-                    for idx in range(1, num_tracks + 1):
-                        tracks_info.append({
-                            "num": idx,
-                            "titre": f"Piste {idx}",
-                            "artiste": artiste_principal,
-                            "duree_fmt": "--:--"
-                        })
-                medium_title = selected_medium.get("title") if selected_medium else None
-                if medium_title:
-                    full_title = f"{titre_album} - {medium_title}"
-                else:
-                    full_title = titre_album
-                print("Tracklist construite")
-            except Exception as e:
-                print(f"[Erreur parsing tracklist] {e}")
-                self.after(0, lambda err=e: self.title_label.config(
-                    text=f"Erreur lecture pistes : {err}"))
-                return
+    def _on_disc_toc(self, session):
+        if session is not self.disc_session:
+            return
+        cd_log.info("TOC lue, démarrage de la lecture")
+        self.last_album = ""
+        self.last_artist_album = ""
+        self.last_discid = session.disc_id
+        if session.metadata:
+            self.tracks_info = session.metadata["tracks"]
+        else:
+            self.tracks_info = build_tracklist(None, session.num_tracks, "")
+        self.track_index = 1
+        position = None
+        resume = session.resume
+        if resume and 1 <= resume["track"] <= session.num_tracks:
+            cd_log.info("Reprise piste %d à %.0f s", resume["track"], resume["position"])
+            self.track_index = resume["track"]
+            position = resume["position"]
+            self.volume = resume["volume"]
+        self.display_track(self.track_index)
+        self._start_cd_track(position)
 
-            try:
-                print("== Récupération de la pochette ==")
-                cover = fetch_cover_art(mbid)
-                print(f"Cover récupérée ? {'Oui' if cover else 'Non'}")
-            except Exception as e:
-                print(f"[Erreur fetch_cover_art] {e}")
-                cover = None
+    def _on_disc_metadata(self, session, metadata):
+        if session is not self.disc_session:
+            return
+        ui_log.info("Metadata affichées")
+        self.last_album = metadata["album"]
+        self.last_artist_album = metadata["artist"]
+        self.tracks_info = metadata["tracks"]
+        self.album_label.config(text=metadata["full_title"])
+        self.display_track(self.track_index)
 
-            def update_ui():
-                print("== update_ui ==")
-                self.last_album = titre_album
-                self.last_artist_album = artiste_principal
-                self.tracks_info = tracks_info
-                self.album_label.config(text=full_title)
-                if cover:
-                    self._display_cover(cover)
-                else:
-                    self.album_canvas.delete("all")
-                    self.album_canvas.create_rectangle(
-                        0, 0, ALBUM_ART_SIZE[0], ALBUM_ART_SIZE[1], fill="black", outline="black"
-                    )
-                self.track_index = 1
-                self.display_track(self.track_index)
-                self._start_cd_track()
+    def _on_disc_cover(self, session, cover):
+        if session is not self.disc_session:
+            return
+        if cover:
+            self._display_cover(cover)
+        else:
+            self.album_canvas.delete("all")
+            self.album_canvas.create_rectangle(
+                0, 0, ALBUM_ART_SIZE[0], ALBUM_ART_SIZE[1], fill="black", outline="black"
+            )
+
+    def _on_disc_error(self, session, err):
+        if session is not self.disc_session:
+            return
+        self.title_label.config(text=f"Erreur lecture pistes : {err}")
 
-            self.after(0, update_ui)
+    def load_cover(self, key, url, timeout=5):
+        self.image_loader.request(
+            key, url,
+            lambda gen, img: self.dispatcher.post(lambda: self._on_cover_loaded(gen, img), key="cover"),
+            timeout=timeout
+        )
 
-        threading.Thread(target=fetch_and_display, daemon=True).start()
+    def _on_cover_loaded(self, generation, img):
+        if not self.image_loader.is_current(generation):
+            return
+        if img:
+            self._display_cover(img)
+        else:
+            self.album_canvas.delete("all")
 
     def _display_cover(self, pil_image):
         self.album_canvas.delete("all")
@@ -538,68 +3212,71 @@ class MusicKioskApp(tk.Tk):
             self.title_label.config(text=f"Piste {index}")
             self.artist_label.config(text=self.last_artist_album)
 
-    def _start_cd_track(self):
-        self._stop_cd_process()
-        cdda_uri = f"cdda://{self.track_index}"
-        pipeline_str = f'uridecodebin uri={cdda_uri} ! volume name=cd_volume volume={self.volume / 100.0} ! queue max-size-buffers=0 max-size-time=0 max-size-bytes=2097152 !audioconvert ! audioresample ! alsasink device={ALSA_DEVICE}'
-        print(f"Avant parse_launch : {time.time()}")
-        self.cd_pipeline = Gst.parse_launch(pipeline_str)
-        print(f"Après parse_launch : {time.time()}")
-        buscd = self.cd_pipeline.get_bus()
-        buscd.add_signal_watch()
-        buscd.connect("message", self._on_gst_message)
-        volume_elem = self.cd_pipeline.get_by_name("cd_volume")
-        if volume_elem:
-            volume_elem.set_property("volume", self.volume / 100.0)
-        print(f"Avant set_state PLAYING : {time.time()}")
-        self.cd_pipeline.set_state(Gst.State.PLAYING)
-        print(f"Après set_state PLAYING : {time.time()}")
+    def _start_cd_track(self, position=None):
+        if self.cd_engine is None:
+            self.cd_engine = CdEngine(
+                CD_DEVICE, ALSA_DEVICE,
+                on_track_change=lambda idx: self.dispatcher.post(lambda: self._on_cd_track_change(idx), key="cd_track"),
+                on_end=lambda: self.dispatcher.post(self._on_cd_end),
+                on_error=lambda err: self.dispatcher.post(lambda: self._on_cd_error(err)),
+                on_playing=lambda: self.mark_first_audio("CD"),
+                uri_for=self._cd_track_uri,
+            )
+            self.volume_engine.attach_element(self.cd_engine.volume_elem)
+        self.cd_engine.play_track(self.track_index, len(self.tracks_info), position)
         self.cd_playing = True
         self.volume_scale.set(self.volume)
 
+    def _cd_track_uri(self, index):
+        # Appelé aussi depuis le thread de streaming (about-to-finish)
+        session = self.disc_session
+        path = rip_cache.track_path(session.disc_id, index) if session and session.disc_id else None
+        if path:
+            return "file://" + urllib.parse.quote(path)
+        if session and session.disc_id:
+            rip_cache.follow(session.disc_id, index)
+        return CD_URI.format(track=index)
+
+    def _save_cd_state(self):
+        # Instantané pris sur le thread Tk avant l'arrêt du moteur ;
+        # l'écriture SQLite part en tâche de fond
+        session = self.disc_session
+        if not session or not session.disc_id or not self.cd_engine:
+            return
+        if self.cd_engine.active:
+            track, position = self.track_index, self.cd_engine.position() or 0.0
+        else:
+            track, position = 1, 0.0
+        session.resume = {"track": track, "position": position, "volume": self.volume}
+        workers.spawn("cache", metadata_cache.put_resume, session.disc_id, track, position, self.volume)
+
     def _stop_cd_process(self):
-        if self.cd_pipeline:
-            self.cd_pipeline.set_state(Gst.State.NULL)
-            self.cd_pipeline = None
+        if self.cd_engine:
+            self.cd_engine.stop()
             self.cd_playing = False
-    
-    def start_spotifyd(self):
-        # Lance spotifyd si pas déjà lancé
-        if not hasattr(self, "_spotifyd_proc") or self._spotifyd_proc.poll() is not None:
-            self._spotifyd_proc = subprocess.Popen(
-                ["/usr/local/bin/spotifyd", "--no-daemon", "--config-path", "/home/player/.config/spotifyd/spotifyd.conf"]
-            )
 
-    def stop_spotifyd(self):
-        if hasattr(self, "_spotifyd_proc") and self._spotifyd_proc.poll() is None:
-            self._spotifyd_proc.terminate()
+    def _on_cd_track_change(self, index):
+        # Enchaînement gapless : le moteur est déjà sur la piste suivante
+        self.track_index = index
+        self.display_track(self.track_index)
 
-    def _on_gst_message(self, buscd, message):
-        t = message.type
-        if t == Gst.MessageType.EOS:
-            self.cd_pipeline.set_state(Gst.State.NULL)
-            self.cd_playing = False
-            if self.track_index < len(self.tracks_info):
-                self.track_index += 1
-                self.display_track(self.track_index)
-                self._start_cd_track()
-            else:
-                self.title_label.config(text="Fin du CD")
-        elif t == Gst.MessageType.ERROR:
-            err, dbg = message.parse_error()
-            self.title_label.config(text=f"Erreur GStreamer : {err}")
-            self.cd_pipeline.set_state(Gst.State.NULL)
-            self.cd_playing = False
+    def _on_cd_end(self):
+        self.cd_playing = False
+        self.title_label.config(text="Fin du CD")
+
+    def _on_cd_error(self, err):
+        self.cd_playing = False
+        self.title_label.config(text=f"Erreur GStreamer : {err}")
 
     def _pause_cd(self):
-        if self.cd_pipeline:
-            self.cd_pipeline.set_state(Gst.State.PAUSED)
+        if self.cd_engine and self.cd_engine.active:
+            self.cd_engine.pause()
             self.cd_playing = False
             self.title_label.config(text=f"(Pause) {self.title_label['text']}")
 
     def _resume_cd(self):
-        if self.cd_pipeline:
-            self.cd_pipeline.set_state(Gst.State.PLAYING)
+        if self.cd_engine and self.cd_engine.active:
+            self.cd_engine.resume()
             self.cd_playing = True
 
     def play_pause(self):
@@ -624,12 +3301,9 @@ class MusicKioskApp(tk.Tk):
     def on_volume_change(self, val):
         try:
             self.volume = int(val)
-            if self.cd_pipeline:
-                volume_elem = self.cd_pipeline.get_by_name("cd_volume")
-                if volume_elem:
-                    volume_elem.set_property("volume", self.volume / 100.0)
+            self.volume_engine.set(self.volume)
         except Exception as e:
-            print(f"[Volume] Erreur lors du changement de volume : {e}")
+            ui_log.error("Erreur lors du changement de volume : %s", e)
 
     def play_spotify(self):
         self.status_label.config(text="Lecture Spotify Connect")
@@ -639,69 +3313,81 @@ class MusicKioskApp(tk.Tk):
         self.album_canvas.delete("all")
         self._stop_cd_process()
 
-        # Variable pour éviter le multi-thread d’update
-        self._spotify_update_running = True
-
-        def update_spotify_info():
-            last_track_id = None
-
-            while getattr(self, '_spotify_update_running', False):
-                try:
-                    bus = SessionBus()
-                    service_name = get_spotifyd_mpris_name(bus)
-                    if not service_name:
-                        raise Exception("Kiosk")
-                    player = bus.get(service_name, "/org/mpris/MediaPlayer2")
-                    metadata = player.Metadata
-                    title = metadata.get('xesam:title', 'Inconnu')
-                    artists = ', '.join(metadata.get('xesam:artist', []))
-                    album = metadata.get('xesam:album', '')
-                    track_obj = metadata.get('mpris:trackid', None)
-                    track_uri = str(track_obj) if track_obj is not None else None
-                    if track_uri != last_track_id:
-                        # Utilise directement la cover URL fournie (plus fiable et instantané)
-                        cover_url = metadata.get('mpris:artUrl', None)
-                        if cover_url:
-                            try:
-                                response = requests.get(cover_url, timeout=4)
-                                img_data = response.content
-                                img = Image.open(io.BytesIO(img_data)).resize(ALBUM_ART_SIZE, Image.LANCZOS)
-                                self.after(0, lambda img=img: self._display_cover(img))
-                            except Exception:
-                                self.after(0, lambda: self.album_canvas.delete("all"))
-                        else:
-                            self.after(0, lambda: self.album_canvas.delete("all"))
-
-                        self.after(0, lambda: self.title_label.config(text=title))
-                        self.after(0, lambda: self.artist_label.config(text=artists))
-                        self.after(0, lambda: self.album_label.config(text=album))
-                        last_track_id = track_uri
-
-                except Exception as e:
-                    self.after(0, lambda err=e: self.title_label.config(text=f"Attente Connexion : {err}"))
-                    self.after(0, lambda: self.artist_label.config(text=""))
-                    self.after(0, lambda: self.album_label.config(text=""))
-                    self.after(0, lambda: self.album_canvas.delete("all"))
-
-
-                time.sleep(1)
+        self.spotify_source = SpotifySource(
+            on_track=lambda info: self.dispatcher.post(lambda: self._on_spotify_track(info), key="now_playing"),
+            on_waiting=lambda err: self.dispatcher.post(lambda: self._on_spotify_waiting(err), key="now_playing"),
+        )
+        self.spotify_source.start()
+
+    def _on_spotify_track(self, info):
+        self.mark_first_audio("Spotify")
+        self.title_label.config(text=info['title'])
+        self.artist_label.config(text=info['artist'])
+        self.album_label.config(text=info['album'])
+        # Utilise directement la cover URL fournie (plus fiable et instantané)
+        if info['cover']:
+            self.load_cover(info['cover'], info['cover'], timeout=4)
+        else:
+            self.image_loader.cancel()
+            self.album_canvas.delete("all")
 
-        # Lance la mise à jour dans un thread dédié
-        threading.Thread(target=update_spotify_info, daemon=True).start()
+    def _on_spotify_waiting(self, err):
+        self.title_label.config(text=f"Attente Connexion : {err}")
+        self.artist_label.config(text="")
+        self.album_label.config(text="")
+        self.image_loader.cancel()
+        self.album_canvas.delete("all")
 
-    # ... dans ta classe MusicKioskApp, dans play_bluetooth() :
     def play_bluetooth(self):
         self.title_label.config(text="Mode enceinte Bluetooth !")
         self.artist_label.config(text="")
         self.album_label.config(text="")
         self.album_canvas.delete("all")
 
-        if hasattr(self, 'bluetooth_recognizer'):
+        if not AVRCP_ENABLED:
+            self._start_bluetooth_recognizer()
+            return
+        # Métadonnées AVRCP d'abord ; la reconnaissance audio ne démarre que
+        # si l'appareil n'en fournit pas
+        source = AvrcpSource(
+            on_track=lambda info: self.dispatcher.post(lambda: self._on_avrcp_track(source, info), key="now_playing"),
+            on_metadata=lambda available: self.dispatcher.post(
+                lambda: self._on_avrcp_metadata(source, available), key="avrcp"
+            ),
+        )
+        self.avrcp_source = source
+        source.start()
+
+    def _start_bluetooth_recognizer(self):
+        if self.bluetooth_recognizer:
             self.bluetooth_recognizer.stop()
 
-        self.bluetooth_recognizer = BluetoothRecognizer(self.update_ui_from_shazam)
+        self.bluetooth_recognizer = make_bluetooth_recognizer(
+            self.update_ui_from_shazam, on_music=lambda: self.mark_first_audio("Bluetooth")
+        )
         self.bluetooth_recognizer.start()
 
+    def _on_avrcp_metadata(self, source, available):
+        if source is not self.avrcp_source or not source.active:
+            return
+        if available:
+            bluetooth_log.info("Titres fournis par AVRCP, reconnaissance audio inutile")
+            if self.bluetooth_recognizer:
+                self.bluetooth_recognizer.stop()
+                self.bluetooth_recognizer = None
+        elif not self.bluetooth_recognizer:
+            bluetooth_log.info("Pas de métadonnées AVRCP, reconnaissance audio")
+            self.title_label.config(text="Mode enceinte Bluetooth !")
+            self.artist_label.config(text="")
+            self.album_label.config(text="")
+            self._start_bluetooth_recognizer()
+
+    def _on_avrcp_track(self, source, info):
+        if source is not self.avrcp_source or not source.active:
+            return
+        self.mark_first_audio("Bluetooth")
+        self.update_ui_from_shazam(info)
+
     def update_ui_from_shazam(self, track_info):
         def ui_update():
             self.title_label.config(text=track_info['title'])
@@ -709,20 +3395,34 @@ class MusicKioskApp(tk.Tk):
             self.album_label.config(text=track_info['album'])
 
             if track_info['cover']:
-                try:
-                    response = requests.get(track_info['cover'], timeout=5)
-                    img = Image.open(io.BytesIO(response.content)).resize(ALBUM_ART_SIZE, Image.LANCZOS)
-                    self._display_cover(img)
-                except:
-                    self.album_canvas.delete("all")
+                # téléchargement hors du thread Tk, affiché seulement si la
+                # piste n'a pas changé entre-temps
+                self.load_cover(track_info['cover'], track_info['cover'])
             else:
+                self.image_loader.cancel()
                 self.album_canvas.delete("all")
-        self.after(0, ui_update)
+        self.dispatcher.post(ui_update, key="now_playing")
+
+def prewarm_modules():
+    # Import des dépendances des sources pendant que l'interface est inactive
+    modules = PREWARM_MODULES
+    if not RECOGNIZER_PROCESS:
+        modules = modules + PREWARM_RECOGNIZER_MODULES
+    for module in modules:
+        try:
+            module.load()
+        except Exception as e:
+            startup_log.warning("Préchauffage de %s impossible : %s", module._name, e)
+    startup_profile.report("Préchauffage terminé")
+
+def on_first_frame(app):
+    app.update_idletasks()
+    startup_profile.report("Première trame")
+    if PREWARM:
+        app.after(PREWARM_DELAY_MS, lambda: threading.Thread(target=prewarm_modules, daemon=True).start())
 
 if __name__ == '__main__':
     # Boucle Tkinter ET GStreamer mainloop (intégration)
-    import threading
-
     def run_glib():
         loop = GLib.MainLoop()
         loop.run()
@@ -731,6 +3431,14 @@ if __name__ == '__main__':
     glib_thread = threading.Thread(target=run_glib, daemon=True)
     glib_thread.start()
 
+    if METRICS_ENABLED:
+        try:
+            MetricsServer(metrics, METRICS_BIND, METRICS_PORT, ring=log_ring).start()
+        except OSError as e:
+            metrics_log.warning("Serveur indisponible sur %s:%s : %s", METRICS_BIND, METRICS_PORT, e)
+
     # Lance l'interface
-    app = MusicKioskApp()
+    with startup_profile.step("MusicKioskApp()"):
+        app = MusicKioskApp()
+    app.after_idle(lambda: on_first_frame(app))
     app.mainloop()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Banc de mesure hors ligne du kiosque : fait tourner MusicKioskApp sans
+# matériel ni réseau et compare les résultats à une référence enregistrée.
+#
+# Remplaçants utilisés :
+#  - serveur HTTP local pour MusicBrainz, Cover Art Archive et Shazam
+#  - faux module discid (TOC synthétique)
+#  - pistes WAV générées + fakesink à la place de cdda:// et alsasink
+#  - flux PCM synthétique (musique / blancs) à la place de arecord
+#
+# Usage (sans écran : xvfb-run python3 tools/bench_kiosk.py) :
+#   python3 tools/bench_kiosk.py                   # mesure + comparaison
+#   python3 tools/bench_kiosk.py --save-baseline   # enregistre la référence
+
+import argparse
+import configparser
+import http.server
+import io
+import json
+import math
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import types
+import wave
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+RATE = 44100
+CHANNELS = 2
+DISC_ID = "BenchDiscId0000000000000000-"
+RELEASE_ID = "00000000-0000-4000-8000-000000000001"
+
+
+# --- Données synthétiques ---
+def tone(freqs, seconds, amplitude=6000):
+    import numpy as np
+    t = np.arange(int(RATE * seconds)) / RATE
+    mono = sum(np.sin(2 * np.pi * f * t) for f in freqs) * (amplitude / len(freqs))
+    return np.repeat(mono[:, None], CHANNELS, axis=1).astype(np.int16)
+
+
+def write_wav(path, frames):
+    with wave.open(path, "wb") as w:
+        w.setnchannels(CHANNELS)
+        w.setsampwidth(2)
+        w.setframerate(RATE)
+        w.writeframes(frames.tobytes())
+
+
+def build_media(workdir, tracks, track_seconds):
+    import numpy as np
+    for idx in range(1, tracks + 1):
+        write_wav(os.path.join(workdir, f"track{idx:02d}.wav"),
+                  tone([220 * idx, 330 * idx], track_seconds))
+    # flux Bluetooth : trois morceaux séparés par des blancs
+    parts = []
+    for song in range(3):
+        for step in range(12):
+            parts.append(tone([200 + 90 * song + 40 * (step % 4), 600 + 70 * step], 1))
+        parts.append(np.zeros((RATE * 3, CHANNELS), dtype=np.int16))
+    stream = os.path.join(workdir, "bluetooth.raw")
+    with open(stream, "wb") as f:
+        f.write(np.concatenate(parts).tobytes())
+    return stream
+
+
+def cover_jpeg():
+    from PIL import Image
+    out = io.BytesIO()
+    Image.new("RGB", (250, 250), color=(180, 40, 40)).save(out, "JPEG")
+    return out.getvalue()
+
+
+def musicbrainz_xml(tracks):
+    track_xml = "".join(
+        f'<track id="t{i}"><position>{i}</position><number>{i}</number><length>180000</length>'
+        f'<recording id="r{i}"><title>Bench Track {i}</title></recording></track>'
+        for i in range(1, tracks + 1)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<metadata xmlns="http://musicbrainz.org/ns/mmd-2.0#">'
+        f'<disc id="{DISC_ID}"><sectors>200000</sectors>'
+        f'<release-list count="1"><release id="{RELEASE_ID}"><title>Bench Album</title>'
+        '<artist-credit><name-credit><artist id="a1"><name>Bench Artist</name></artist>'
+        '</name-credit></artist-credit>'
+        '<medium-list count="1"><medium><position>1</position>'
+        f'<disc-list count="1"><disc id="{DISC_ID}"><sectors>200000</sectors></disc></disc-list>'
+        f'<track-list count="{tracks}" offset="0">{track_xml}</track-list>'
+        '</medium></medium-list></release></release-list></disc></metadata>'
+    ).encode()
+
+
+# --- Serveur local MusicBrainz / Cover Art Archive / Shazam ---
+class StubServer:
+    def __init__(self, tracks, latency):
+        xml = musicbrainz_xml(tracks)
+        jpeg = cover_jpeg()
+        counter = {"shazam": 0}
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def _reply(self, body, content_type):
+                time.sleep(latency)
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith("/ws/2/discid/"):
+                    self._reply(xml, "application/xml")
+                elif self.path.startswith("/release/"):
+                    self._reply(jpeg, "image/jpeg")
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                counter["shazam"] += 1
+                n = counter["shazam"]
+                body = json.dumps({"track": {
+                    "key": f"bench-{n}", "title": f"Bench Song {n}", "subtitle": "Bench Artist",
+                    "sections": [{"metadata": [{"text": "Bench Album"}]}], "images": {},
+                }}).encode()
+                self._reply(body, "application/json")
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+
+def fake_discid(tracks):
+    # même interface que python-libdiscid / python-discid pour ce que lit le kiosque
+    offsets = [150 + i * 13500 for i in range(tracks)]
+    disc = types.SimpleNamespace(
+        id=DISC_ID, first_track_num=1, last_track_num=tracks, disc_number=1,
+        sectors=150 + tracks * 13500, track_offsets=offsets,
+    )
+    return types.SimpleNamespace(read=lambda device=None: disc)
+
+
+def write_config(workdir, stub, stream):
+    config = configparser.ConfigParser()
+    config.read(os.path.join(BASE_DIR, "kiosk_config.ini"))
+    overrides = {
+        "PATHS": {"ICON_DIR": os.path.join(BASE_DIR, "icons")},
+        "AUDIO": {
+            "CD_URI": "file://" + os.path.join(workdir, "track{track:02d}.wav"),
+            "AUDIO_SINK": "fakesink sync=true",
+            "CAPTURE_COMMAND": f"{sys.executable} {os.path.abspath(__file__)} --emit-pcm {stream}",
+        },
+        "NETWORK": {
+            "MUSICBRAINZ_HOST": f"127.0.0.1:{stub.port}",
+            "MUSICBRAINZ_HTTPS": "no",
+            "COVERART_URL": f"http://127.0.0.1:{stub.port}",
+            "SHAZAM_URL": f"http://127.0.0.1:{stub.port}",
+        },
+        "CACHE": {"DIR": os.path.join(workdir, "cache"), "RIP": "no"},
+        "VOLUME": {"MODE": "software"},
+        "METRICS": {"ENABLED": "no"},
+        "LOGGING": {"FILE": os.path.join(workdir, "kiosk.log")},
+        "STARTUP": {"PREWARM": "no"},
+    }
+    for section, values in overrides.items():
+        if not config.has_section(section):
+            config.add_section(section)
+        for key, value in values.items():
+            config.set(section, key, value)
+    path = os.path.join(workdir, "kiosk_config.ini")
+    with open(path, "w") as f:
+        config.write(f)
+    return path
+
+
+def emit_pcm(path):
+    # Rejoue le fichier PCM en boucle, au rythme réel, sur stdout (remplace arecord)
+    chunk = RATE // 10 * CHANNELS * 2
+    out = sys.stdout.buffer
+    start = time.monotonic()
+    sent = 0
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(chunk)
+            if not data:
+                f.seek(0)
+                continue
+            out.write(data)
+            out.flush()
+            sent += len(data)
+            delay = start + sent / (RATE * CHANNELS * 2) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+# --- Scénarios ---
+class Bench:
+    def __init__(self, kiosk, app, tracks):
+        self.kiosk = kiosk
+        self.app = app
+        self.tracks = tracks
+        self.results = {}
+
+    def pump_until(self, condition, timeout=30):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            self.app.update()
+            if condition():
+                return True
+            time.sleep(0.002)
+        raise TimeoutError("condition non atteinte")
+
+    def histogram_count(self, name):
+        series = self.kiosk.metrics.series[name]
+        return sum(serie[2] for serie in series.values())
+
+    def cd_pass(self, label):
+        app = self.app
+        before = self.histogram_count("kiosk_disc_tracklist_seconds")
+        start = time.perf_counter()
+        app.select_source("CD")
+        # la tracklist de la passe précédente ne doit pas compter : on attend
+        # une nouvelle observation, puis son affichage
+        app.tracks_info = []
+        self.pump_until(lambda: self.histogram_count("kiosk_disc_tracklist_seconds") > before
+                        and app.tracks_info and app.tracks_info[0]["titre"] == "Bench Track 1")
+        self.results[f"time_to_tracklist_{label}_s"] = time.perf_counter() - start
+        self.pump_until(lambda: app._tap_pending is None)
+        self.results[f"time_to_first_audio_{label}_s"] = time.perf_counter() - start
+
+    def track_skips(self, count=3):
+        app = self.app
+        durations = []
+        for _ in range(count):
+            before = self.histogram_count("kiosk_cd_playing_seconds")
+            start = time.perf_counter()
+            if app.track_index >= len(app.tracks_info):
+                app.prev_track()
+            else:
+                app.next_track()
+            self.pump_until(lambda: self.histogram_count("kiosk_cd_playing_seconds") > before)
+            durations.append(time.perf_counter() - start)
+        self.results["track_skip_s"] = sum(durations) / len(durations)
+
+    def recognizer_cpu(self, seconds):
+        if self.app.cd_engine:
+            self.app.cd_engine.stop()
+        found = []
+        recognizer = self.kiosk.make_bluetooth_recognizer(found.append)
+        # le recognizer peut tourner dans un processus fils : compté une
+        # fois celui-ci terminé (RUSAGE_CHILDREN)
+        cpu = time.process_time() + children_cpu()
+        wall = time.perf_counter()
+        recognizer.start()
+        while time.perf_counter() - wall < seconds:
+            self.app.update()
+            time.sleep(0.05)
+        recognizer.stop()
+        elapsed = time.perf_counter() - wall
+        # laisse le fils s'arrêter pour que son temps CPU soit compté
+        self.pump_until(lambda: self.kiosk.workers.active_count("Bluetooth") == 0)
+        self.results["recognizer_cpu_s_per_min"] = (time.process_time() + children_cpu() - cpu) / elapsed * 60
+        self.results["recognitions"] = len(found)
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"{'mesure':34} {'valeur':>10} {'référence':>10} {'écart':>8}")
+    for name, value in results.items():
+        ref = baseline.get(name)
+        if ref is None or name == "recognitions":
+            print(f"{name:34} {value:10.3f} {'-':>10} {'-':>8}")
+            continue
+        delta = (value - ref) / ref if ref else 0.0
+        flag = "  ⚠" if delta > tolerance else ""
+        print(f"{name:34} {value:10.3f} {ref:10.3f} {delta * 100:+7.1f}%{flag}")
+        if delta > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de mesure hors ligne du kiosque")
+    parser.add_argument("--emit-pcm", help=argparse.SUPPRESS)
+    parser.add_argument("--tracks", type=int, default=4)
+    parser.add_argument("--track-seconds", type=float, default=20)
+    parser.add_argument("--latency", type=float, default=0.15, help="latence simulée des services (s)")
+    parser.add_argument("--bluetooth-seconds", type=float, default=60)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="régression tolérée (0.15 = 15 %)")
+    args = parser.parse_args()
+
+    if args.emit_pcm:
+        emit_pcm(args.emit_pcm)
+        return 0
+
+    workdir = tempfile.mkdtemp(prefix="kiosk-bench-")
+    stream = build_media(workdir, args.tracks, args.track_seconds)
+    stub = StubServer(args.tracks, args.latency)
+    os.environ["KIOSK_CONFIG"] = write_config(workdir, stub, stream)
+
+    sys.path.insert(0, BASE_DIR)
+    import kiosk
+    kiosk.discid = fake_discid(args.tracks)
+    threading.Thread(target=lambda: kiosk.GLib.MainLoop().run(), daemon=True).start()
+
+    rss_start = rss_mb()
+    app = kiosk.MusicKioskApp()
+    app.withdraw()
+    bench = Bench(kiosk, app, args.tracks)
+    bench.cd_pass("cold")
+    bench.track_skips()
+    bench.cd_pass("cached")
+    bench.recognizer_cpu(args.bluetooth_seconds)
+    bench.results["memory_growth_mb"] = rss_mb() - rss_start
+    app.destroy()
+
+    results = bench.results
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Référence enregistrée dans {args.baseline}")
+    elif regressions:
+        print("Régressions : " + ", ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
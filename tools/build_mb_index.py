@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Construit l'index MusicBrainz local du kiosque (recherche de disque sans
+# réseau) à partir d'un export de la base MusicBrainz :
+#   https://data.metabrainz.org/pub/musicbrainz/data/fullexport/
+# Il suffit d'extraire mbdump.tar.bz2 ; seules les tables cdtoc,
+# medium_cdtoc, medium, release, track et artist_credit sont lues, et seuls
+# les media ayant au moins un disc ID sont gardés.
+#
+# À lancer sur un PC (plusieurs Go de texte à parcourir), puis copier le
+# fichier produit sur le kiosque (CACHE/OFFLINE_INDEX) :
+#   python3 tools/build_mb_index.py ~/mbdump musicbrainz_index.sqlite
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+SCHEMA = """
+CREATE TABLE releases (id INTEGER PRIMARY KEY, mbid TEXT NOT NULL, title TEXT, artist TEXT);
+CREATE TABLE media (id INTEGER PRIMARY KEY, release INTEGER NOT NULL, position INTEGER,
+                    title TEXT, tracks TEXT NOT NULL);
+CREATE TABLE tocs (discid TEXT PRIMARY KEY, medium INTEGER NOT NULL, track_count INTEGER NOT NULL,
+                   leadout INTEGER NOT NULL, offsets TEXT NOT NULL) WITHOUT ROWID;
+CREATE INDEX tocs_shape ON tocs (track_count, leadout);
+"""
+
+ESCAPES = {"t": "\t", "n": "\n", "r": "\r", "\\": "\\"}
+
+
+def unescape(value):
+    # format texte de COPY PostgreSQL : \N = NULL, \t \n \\ échappés
+    if value == "\\N":
+        return None
+    if "\\" not in value:
+        return value
+    out = []
+    chars = iter(value)
+    for c in chars:
+        if c == "\\":
+            nxt = next(chars, "")
+            out.append(ESCAPES.get(nxt, nxt))
+        else:
+            out.append(c)
+    return "".join(out)
+
+
+def rows(dump, table):
+    path = os.path.join(dump, table)
+    if not os.path.exists(path):
+        path = os.path.join(dump, "mbdump", table)
+    start = time.time()
+    count = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            count += 1
+            yield [unescape(v) for v in line.rstrip("\n").split("\t")]
+    print(f"{table} : {count} lignes en {time.time() - start:.0f} s")
+
+
+def build(dump, output):
+    # cdtoc : id, discid, freedb_id, track_count, leadout_offset, track_offset[]
+    cdtocs = {}
+    for r in rows(dump, "cdtoc"):
+        cdtocs[int(r[0])] = (r[1], int(r[3]), int(r[4]), r[5].strip("{}"))
+
+    # medium_cdtoc : id, medium, cdtoc
+    tocs = []
+    for r in rows(dump, "medium_cdtoc"):
+        toc = cdtocs.get(int(r[2]))
+        if toc:
+            tocs.append((toc[0], int(r[1]), toc[1], toc[2], toc[3]))
+    del cdtocs
+    media_ids = {t[1] for t in tocs}
+
+    # medium : id, release, position, format, name, …
+    media = {}
+    for r in rows(dump, "medium"):
+        medium_id = int(r[0])
+        if medium_id in media_ids:
+            media[medium_id] = (int(r[1]), int(r[2]) if r[2] else None, r[4] or None)
+    release_ids = {m[0] for m in media.values()}
+
+    # release : id, gid, name, artist_credit, …
+    releases = {}
+    credits = set()
+    for r in rows(dump, "release"):
+        release_id = int(r[0])
+        if release_id in release_ids:
+            releases[release_id] = (r[1], r[2], int(r[3]))
+            credits.add(int(r[3]))
+
+    # track : id, gid, recording, medium, position, number, name,
+    #         artist_credit, length, edits_pending, last_updated, is_data_track
+    tracks = {}
+    for r in rows(dump, "track"):
+        medium_id = int(r[3])
+        if medium_id not in media_ids or (len(r) > 11 and r[11] == "t"):
+            continue
+        credit = int(r[7])
+        credits.add(credit)
+        tracks.setdefault(medium_id, []).append(
+            (int(r[4]), r[5], r[6], credit, int(r[8]) if r[8] else None)
+        )
+
+    # artist_credit : id, name, …
+    names = {}
+    for r in rows(dump, "artist_credit"):
+        credit = int(r[0])
+        if credit in credits:
+            names[credit] = r[1]
+
+    if os.path.exists(output):
+        os.remove(output)
+    db = sqlite3.connect(output)
+    db.executescript(SCHEMA)
+    with db:
+        db.executemany(
+            "INSERT INTO releases VALUES (?, ?, ?, ?)",
+            ((rid, mbid, title, names.get(credit)) for rid, (mbid, title, credit) in releases.items())
+        )
+        media_rows = []
+        for medium_id, (release_id, position, title) in media.items():
+            release_credit = releases.get(release_id, (None, None, None))[2]
+            # artiste de piste seulement s'il diffère de celui de la release
+            track_list = [
+                [number, name, names.get(credit) if credit != release_credit else None, length]
+                for _, number, name, credit, length in sorted(tracks.get(medium_id, []))
+            ]
+            media_rows.append((medium_id, release_id, position, title,
+                               json.dumps(track_list, ensure_ascii=False, separators=(",", ":"))))
+        db.executemany("INSERT INTO media VALUES (?, ?, ?, ?, ?)", media_rows)
+        db.executemany("INSERT OR IGNORE INTO tocs VALUES (?, ?, ?, ?, ?)", tocs)
+    db.execute("VACUUM")
+    db.close()
+    print(f"{len(tocs)} TOC, {len(media)} media, {len(releases)} releases -> {output} "
+          f"({os.path.getsize(output) / (1024 * 1024):.0f} Mo)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index MusicBrainz local pour le kiosque")
+    parser.add_argument("dump", help="répertoire mbdump extrait")
+    parser.add_argument("output", help="fichier SQLite à produire")
+    args = parser.parse_args()
+    build(args.dump, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Faux BlueZ pour essayer le chemin AVRCP du kiosque sans téléphone :
+# publie sur le bus de session un ObjectManager et un lecteur
+# org.bluez.MediaPlayer1 dont la piste change toutes les N secondes.
+#
+#   python3 tools/mock_bluez_player.py --interval 20
+#   (kiosk_config.ini : [BLUETOOTH] BUS = session)
+#
+# --no-metadata publie un lecteur sans titre : le kiosque doit alors
+# basculer sur la reconnaissance audio.
+
+import argparse
+import itertools
+import sys
+
+import pydbus
+from gi.repository import GLib
+
+PLAYER_PATH = "/org/bluez/hci0/dev_00_11_22_33_44_55/player0"
+PLAYER_IFACE = "org.bluez.MediaPlayer1"
+
+TRACKS = [
+    ("Mock Song One", "Mock Artist", "Mock Album"),
+    ("Mock Song Two", "Mock Artist", "Mock Album"),
+    ("Another Tune", "Someone Else", "Other Album"),
+]
+
+
+def track_variant(title, artist, album):
+    return {
+        "Title": GLib.Variant("s", title),
+        "Artist": GLib.Variant("s", artist),
+        "Album": GLib.Variant("s", album),
+    }
+
+
+class Player:
+    """
+    <node>
+      <interface name="org.bluez.MediaPlayer1">
+        <property name="Status" type="s" access="read"/>
+        <property name="Track" type="a{sv}" access="read"/>
+      </interface>
+    </node>
+    """
+
+    def __init__(self, with_metadata):
+        self.Status = "playing"
+        self.Track = {}
+        if with_metadata:
+            self.Track = track_variant(*TRACKS[0])
+
+
+class Manager:
+    """
+    <node>
+      <interface name="org.freedesktop.DBus.ObjectManager">
+        <method name="GetManagedObjects">
+          <arg type="a{oa{sa{sv}}}" direction="out"/>
+        </method>
+      </interface>
+    </node>
+    """
+
+    def __init__(self, player):
+        self.player = player
+
+    def GetManagedObjects(self):
+        return {PLAYER_PATH: {PLAYER_IFACE: {
+            "Status": GLib.Variant("s", self.player.Status),
+            "Track": GLib.Variant("a{sv}", self.player.Track),
+        }}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Faux lecteur BlueZ AVRCP (bus de session)")
+    parser.add_argument("--name", default="org.bluez")
+    parser.add_argument("--interval", type=float, default=20, help="secondes entre deux pistes")
+    parser.add_argument("--no-metadata", action="store_true")
+    args = parser.parse_args()
+
+    bus = pydbus.SessionBus()
+    player = Player(not args.no_metadata)
+    bus.publish(args.name, ("/", Manager(player)), (PLAYER_PATH, player))
+    print(f"{args.name} publié, lecteur {PLAYER_PATH}")
+
+    if not args.no_metadata:
+        tracks = itertools.cycle(TRACKS[1:] + TRACKS[:1])
+
+        def next_track():
+            title, artist, album = next(tracks)
+            player.Track = track_variant(title, artist, album)
+            bus.con.emit_signal(
+                None, PLAYER_PATH, "org.freedesktop.DBus.Properties", "PropertiesChanged",
+                GLib.Variant("(sa{sv}as)", (PLAYER_IFACE, {"Track": GLib.Variant("a{sv}", player.Track)}, []))
+            )
+            print(f"Piste : {artist} – {title}")
+            return True
+
+        GLib.timeout_add(int(args.interval * 1000), next_track)
+    GLib.MainLoop().run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())